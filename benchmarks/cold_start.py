@@ -0,0 +1,59 @@
+"""
+Cold-start time of the `oss-lifecycle` command.
+Runs `src/cli.py` in fresh interpreters with `--help` and with `<command> --help`
+for every command, which imports only what the command needs, and reports the
+median wall time of each. Exits with status 1 if any median is over its budget,
+so it can guard against a heavy import creeping back in at module level.
+Usage:
+    python benchmarks/cold_start.py [--repeat 5] [--budget 0.5] [--command-budget 2.0]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, 'src', 'cli.py')
+
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+from cli import COMMANDS  # noqa: E402
+
+
+def cold_start(args, repeat):
+    """Median seconds to run the CLI with `args` in a new interpreter"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, CLI, *args], capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold-start time of the CLI")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per command")
+    parser.add_argument('--budget', type=float, default=0.5,
+                        help="seconds allowed for `oss-lifecycle --help`")
+    parser.add_argument('--command-budget', type=float, default=2.0,
+                        help="seconds allowed for `oss-lifecycle <command> --help`")
+    args = parser.parse_args()
+
+    over = []
+    runs = [(['--help'], args.budget)] + [([command, '--help'], args.command_budget)
+                                          for command in COMMANDS]
+    for cli_args, budget in runs:
+        seconds = cold_start(cli_args, args.repeat)
+        status = 'ok' if seconds <= budget else 'OVER BUDGET'
+        if seconds > budget:
+            over.append(' '.join(cli_args))
+        print(f"oss-lifecycle {' '.join(cli_args):<22} {seconds:6.3f}s  (budget {budget:.1f}s) {status}")
+
+    if over:
+        sys.exit(f"Over budget: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
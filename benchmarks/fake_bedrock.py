@@ -0,0 +1,90 @@
+"""
+Local stand-in for the Bedrock Runtime `invoke_model` API, for testing and timing
+`activity_report` without AWS.
+It answers `POST /model/<model id>/invoke` after a fixed latency with a short
+"summary" of the prompt (one numbered line per text for batched prompts), and throttles a share of requests with the same 429
+ThrottlingException that Bedrock returns, so retries can be exercised.
+Usage:
+    python benchmarks/fake_bedrock.py [--port 8765] [--latency 0.5] [--throttle 0.1]
+
+    Then, from the root folder:
+    BEDROCK_ENDPOINT_URL=http://127.0.0.1:8765 AWS_ACCESS_KEY_ID=x AWS_SECRET_ACCESS_KEY=x \
+        python src/activity_report.py <owner>/<repo> YYYY-MM --concurrency 16
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBedrockHandler(BaseHTTPRequestHandler):
+    latency = 0.5
+    throttle = 0.0
+    calls = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.lock:
+            FakeBedrockHandler.calls += 1
+        time.sleep(self.latency)
+
+        if random.random() < self.throttle:
+            self.send_json(429, {'message': 'Too many requests, please wait before trying again.'},
+                           {'x-amzn-ErrorType': 'ThrottlingException:http://internal.amazon.com/coral/'})
+            return
+
+        prompt = body['messages'][0]['content']
+        words = prompt.split()
+        numbers = re.findall(r'^\[(\d+)\]', prompt, flags=re.MULTILINE)
+        if numbers:
+            # Batched texts get one numbered line each, as the prompt asks
+            text = "\n".join(f"[{n}] Summary of text {n}" for n in numbers)
+        else:
+            text = f"Summary of {len(words)} words: " + " ".join(words[-12:])
+        self.send_json(200, {
+            'content': [{'type': 'text', 'text': text}],
+            'usage': {'input_tokens': len(words), 'output_tokens': 12},
+        })
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8765, latency=0.5, throttle=0.0):
+    """Start the fake endpoint in a background thread and return the server"""
+    FakeBedrockHandler.latency = latency
+    FakeBedrockHandler.throttle = throttle
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeBedrockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Bedrock Runtime endpoint")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help="seconds per call")
+    parser.add_argument('--throttle', type=float, default=0.0,
+                        help="share of calls answered with ThrottlingException")
+    args = parser.parse_args()
+    server = serve(args.port, args.latency, args.throttle)
+    print(f"Fake Bedrock listening on http://127.0.0.1:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
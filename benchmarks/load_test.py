@@ -0,0 +1,228 @@
+"""
+Load test for the server endpoints.
+Starts `src/server.py` in a scratch folder holding the bundled
+jupyterlab-jupyterlab data and a synthetic git repository, then sends
+concurrent requests to `/run_bass_model`, `/run_innovation_model` and
+`/run_github_gather`, and reports latency percentiles, throughput and the peak
+memory of the server and its worker processes for each endpoint.
+Gathers return a job id at once, so their latency is measured until the job
+is done. Repeat model requests are answered from the result cache unless
+`--cold` is given, which clears the cache before every request.
+Usage:
+    python benchmarks/load_test.py [--requests 40] [--concurrency 8] [--workers 2]
+        [--endpoints bass,innovation,gather] [--production] [--cold]
+        [--commits 2000] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from synthetic_repo import make_repo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_REPO = 'jupyterlab/jupyterlab'
+SYNTHETIC_REPO = 'synthetic/lifecycle'
+
+ENDPOINTS = {
+    'bass': ('/run_bass_model', FIXTURE_REPO),
+    'innovation': ('/run_innovation_model', FIXTURE_REPO),
+    'gather': ('/run_github_gather', SYNTHETIC_REPO),
+}
+
+
+def post(base_url, path, payload, timeout=600):
+    req = urllib.request.Request(base_url + path, data=json.dumps(payload).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        return json.loads(r.read())
+
+
+def get(base_url, path, timeout=600):
+    with urllib.request.urlopen(base_url + path, timeout=timeout) as r:
+        return json.loads(r.read())
+
+
+def tree_rss(pid):
+    """Resident memory in bytes of a process and all its descendants (Linux /proc)"""
+    total = 0
+    pending = [pid]
+    while pending:
+        p = pending.pop()
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f'/proc/{p}/task'):
+                with open(f'/proc/{p}/task/{task}/children') as f:
+                    pending.extend(int(c) for c in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+
+class MemorySampler(threading.Thread):
+    """Samples the server's memory in the background and keeps the peak"""
+    def __init__(self, pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, tree_rss(self.pid))
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+        self.join()
+        return self.peak
+
+
+def one_request(base_url, kind, cold, workdir, refresh):
+    path, repo_name = ENDPOINTS[kind]
+    owner, repo = repo_name.split('/')
+    payload = {'owner': owner, 'repo': repo}
+    if cold:
+        shutil.rmtree(os.path.join(workdir, 'cache'), ignore_errors=True)
+    if kind == 'gather':
+        payload['refresh'] = refresh
+    start = time.perf_counter()
+    result = post(base_url, path, payload)
+    if kind == 'gather' and result.get('success'):
+        while result.get('status') not in ('done', 'failed'):
+            time.sleep(0.1)
+            result = get(base_url, f"/jobs/{result['job_id']}")
+        result['success'] = result['status'] == 'done'
+    return time.perf_counter() - start, result
+
+
+def percentile(values, q):
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def run_endpoint(base_url, server_pid, kind, requests, concurrency, cold, workdir, refresh):
+    sampler = MemorySampler(server_pid)
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(one_request, base_url, kind, cold, workdir, refresh)
+                   for _ in range(requests)]
+        outcomes = [f.result() for f in futures]
+    wall = time.perf_counter() - start
+    peak = sampler.stop()
+
+    latencies = [t for t, _ in outcomes]
+    errors = [r.get('error', '')[-300:] for _, r in outcomes if not r.get('success')]
+    return {
+        'endpoint': ENDPOINTS[kind][0],
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'cache_hits': sum(1 for _, r in outcomes if r.get('cached')),
+        'p50_s': percentile(latencies, 50),
+        'p95_s': percentile(latencies, 95),
+        'p99_s': percentile(latencies, 99),
+        'max_s': max(latencies),
+        'mean_s': statistics.mean(latencies),
+        'throughput_rps': requests / wall,
+        'peak_rss_mb': peak / 2**20,
+    }
+
+
+def start_server(workdir, port, workers, production, git_url):
+    env = dict(os.environ, OSS_LIFECYCLE_GIT_URL=git_url, PYTHONUNBUFFERED='1')
+    cmd = [sys.executable, os.path.join(ROOT, 'src', 'server.py'),
+           '--port', str(port), '--workers', str(workers)]
+    if production:
+        cmd.append('--production')
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    # A session of its own, so the server and its workers can be stopped together
+    server = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+                              start_new_session=True)
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            sys.exit(f"Server exited, see {log.name}")
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=1).read()
+            return server, base_url
+        except OSError:
+            time.sleep(0.2)
+    stop_server(server)
+    sys.exit("Server did not start within 60s")
+
+
+def stop_server(server):
+    os.killpg(server.pid, signal.SIGTERM)
+    server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the lifecycle server")
+    parser.add_argument('--requests', type=int, default=40, help="requests per endpoint")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2, help="model worker processes")
+    parser.add_argument('--endpoints', default='bass,innovation,gather')
+    parser.add_argument('--production', action='store_true', help="serve with waitress")
+    parser.add_argument('--cold', action='store_true',
+                        help="clear the result cache before every model request")
+    parser.add_argument('--refresh', action='store_true',
+                        help="re-run the gather on every request instead of reusing it")
+    parser.add_argument('--commits', type=int, default=2000,
+                        help="commits in the synthetic repository")
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='oss-lifecycle-load-')
+    os.makedirs(os.path.join(workdir, 'data'))
+    os.makedirs(os.path.join(workdir, 'images'))
+    for name in os.listdir(os.path.join(ROOT, 'data')):
+        if name.startswith(FIXTURE_REPO.replace('/', '-')):
+            shutil.copy(os.path.join(ROOT, 'data', name), os.path.join(workdir, 'data'))
+    repos = os.path.join(workdir, 'repos')
+    make_repo(os.path.join(repos, SYNTHETIC_REPO + '.git'), commits=args.commits)
+
+    server, base_url = start_server(workdir, args.port, args.workers, args.production,
+                                    'file://' + repos + '/')
+    results = []
+    try:
+        for kind in args.endpoints.split(','):
+            result = run_endpoint(base_url, server.pid, kind, args.requests, args.concurrency,
+                                  args.cold, workdir, args.refresh)
+            results.append(result)
+            print(f"{result['endpoint']:<24} p50={result['p50_s']:.3f}s p95={result['p95_s']:.3f}s "
+                  f"p99={result['p99_s']:.3f}s {result['throughput_rps']:.2f} req/s "
+                  f"peak={result['peak_rss_mb']:.0f}MB errors={result['errors']} "
+                  f"cache_hits={result['cache_hits']}")
+    finally:
+        stop_server(server)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
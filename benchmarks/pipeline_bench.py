@@ -0,0 +1,192 @@
+"""
+End-to-end benchmark of the pipeline stages on a synthetic git repository.
+Generates a repository of the given size (see `synthetic_repo.py`) and times
+each stage in this process, in a scratch folder:
+`clone_github_repo`, `collect_commits`, `get_monthly_commits`, `fitBass`,
+`fitInnovation`, `forecastA` and `tokenize_and_count`.
+For each stage it records the wall time, the throughput in items per second
+(commits, months or files) and the peak memory of this process and its git
+subprocesses, and appends the run as one JSON line to a results file, so
+speedups and regressions can be compared over time without network access.
+The tokenizer stage is skipped unless `transformers` and the tokenizer (name
+or local path, `--tokenizer`) can be loaded.
+Usage:
+    python benchmarks/pipeline_bench.py [--commits 2000] [--authors 50] [--files 200]
+        [--churn 20] [--files-per-commit 1] [--years 5] [--seed 0]
+        [--stages clone,commits,...] [--tokenizer NAME] [--workers N]
+        [--output cache/benchmarks/results.jsonl]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+from load_test import MemorySampler
+from synthetic_repo import make_repo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import github_gather  # noqa: E402
+from fit_bass import bass, fitBass, forecastL  # noqa: E402
+from fit_innovation import fitInnovation, forecastA, prepareDF  # noqa: E402
+
+# The models import these on first use; import them here so the import time
+# is never counted in the first model stage timed
+import scipy.optimize  # noqa: E402,F401
+import sklearn.linear_model  # noqa: E402,F401
+
+REPO_NAME = 'synthetic/bench'
+STAGES = ['clone', 'commits', 'monthly', 'bass', 'innovation', 'forecast', 'tokens']
+FORECAST_MONTHS = 120
+
+
+def measure(results, stage, func, items=None, unit=None):
+    """
+    Run `func()` and record its time, throughput and peak memory in `results`
+
+    `items` is a function of the return value giving the number of `unit`s
+    processed, for the throughput
+    """
+    sampler = MemorySampler(os.getpid())
+    sampler.start()
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+    peak = sampler.stop()
+
+    row = {'stage': stage, 'seconds': elapsed, 'peak_rss_mb': peak / 2**20}
+    if items is not None:
+        n = items(value)
+        row.update({'items': n, 'unit': unit, 'per_second': n / elapsed if elapsed else None})
+    results.append(row)
+    rate = f" {row['per_second']:.0f} {unit}/s" if items is not None else ""
+    print(f"{stage:<12} {elapsed:8.3f}s{rate} peak={row['peak_rss_mb']:.0f}MB", flush=True)
+    return value
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', '-C', ROOT, 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, workdir):
+    stages = args.stages.split(',')
+    # Each model stage needs the data of the stages before it, which are run
+    # (but not recorded) even when not asked for
+    last = max([STAGES.index(stage) for stage in stages if stage != 'tokens'], default=0)
+    needed = STAGES[:last + 1]
+
+    results = []
+    repo_string = REPO_NAME.replace('/', '-')
+    origin = make_repo(os.path.join(workdir, 'origin', REPO_NAME + '.git'), commits=args.commits,
+                       authors=args.authors, files=args.files, years=args.years, seed=args.seed,
+                       churn=args.churn, files_per_commit=args.files_per_commit)
+    repo_path = measure(results, 'clone',
+                        lambda: github_gather.clone_github_repo('file://' + origin,
+                                                                os.path.join(workdir, 'bench')),
+                        lambda _: args.commits, 'commits')
+
+    if 'commits' in needed:
+        df_commits = measure(results, 'commits', lambda: github_gather.collect_commits(repo_path),
+                             len, 'commits')
+    if 'monthly' in needed:
+        df = df_commits[['hash', 'author', 'date', 'additions', 'deletions']]
+        df.columns = ['commit_id', 'author', 'date', 'lines_added', 'lines_removed']
+        measure(results, 'monthly', lambda: github_gather.get_monthly_commits(df, REPO_NAME),
+                len, 'months')
+        df = pd.read_csv('data/' + repo_string + '-monthly.csv')
+    if 'bass' in needed:
+        p, q, m = measure(results, 'bass',
+                          lambda: fitBass(df[['contributors']], repo_string, do_plot=False),
+                          lambda _: len(df), 'months')
+    if 'innovation' in needed:
+        # As in run_innovation, the innovation model uses the fitted contributors
+        t = np.arange(len(df))
+        df.loc[:, 'contributors'] = (bass(p, q, t)[0] * m).astype(np.int64)
+        df = prepareDF(df)
+        gamma, lam, phi = measure(results, 'innovation',
+                                  lambda: fitInnovation(df, repo_string, do_plot=False),
+                                  lambda _: len(df), 'months')
+    if 'forecast' in needed:
+        t = np.arange(len(df) + FORECAST_MONTHS)
+        L = forecastL(p, q, m, t)
+        measure(results, 'forecast',
+                lambda: forecastA(gamma, lam, phi, t, df['cumInnovation'][0], df['contributors'], L),
+                len, 'months')
+
+    if 'tokens' in stages:
+        try:
+            import count_tokens
+            count_tokens.load_tokenizer(args.tokenizer)
+        except (ImportError, OSError) as e:
+            print(f"tokens       skipped: {type(e).__name__}: {str(e).splitlines()[0]}")
+        else:
+            blobs = count_tokens.list_blobs(repo_path, quiet=True)
+            measure(results, 'tokens',
+                    lambda: count_tokens.tokenize_and_count(repo_path, workers=args.workers,
+                                                            tokenizer_name=args.tokenizer),
+                    lambda _: len(blobs), 'files')
+
+    return [r for r in results if r['stage'] in stages]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on a synthetic repository")
+    parser.add_argument('--commits', type=int, default=2000)
+    parser.add_argument('--authors', type=int, default=50)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--churn', type=int, default=20, help="most functions added per file changed")
+    parser.add_argument('--files-per-commit', type=int, default=1)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help="comma-separated stages to record, from " + ','.join(STAGES))
+    parser.add_argument('--tokenizer', default='huggingface/CodeBERTa-small-v1',
+                        help="tokenizer name or local path for the tokens stage")
+    parser.add_argument('--workers', type=int, help="tokenizer worker processes")
+    parser.add_argument('--output', default=os.path.join(ROOT, 'cache', 'benchmarks', 'results.jsonl'),
+                        help="results file, one JSON line per run is appended")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='oss-lifecycle-bench-')
+    cwd = os.getcwd()
+    os.makedirs(os.path.join(workdir, 'data'))
+    os.chdir(workdir)
+    try:
+        results = run(args, workdir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    record = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'params': {k: v for k, v in vars(args).items() if k != 'output'},
+        'stages': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    print(f"Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
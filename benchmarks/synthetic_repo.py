@@ -0,0 +1,107 @@
+"""
+Generates synthetic git repositories for benchmarks, without any network access.
+History is written with `git fast-import`, so thousands of commits take seconds.
+Functions:
+    make_repo(path, commits=500, authors=20, files=50, years=3, seed=0, churn=20, files_per_commit=1):
+        Creates a bare repository at `path` with `commits` commits by `authors`
+        authors joining and leaving over `years` years, each commit changing `files_per_commit` of
+        `files` files with up to `churn` new functions each.
+Usage:
+    python benchmarks/synthetic_repo.py <path> [--commits N] [--authors N] [--files N] [--years N]
+        [--churn N] [--files-per-commit N]
+"""
+
+import argparse
+import random
+import subprocess
+import sys
+import time
+
+
+def make_repo(path, commits=500, authors=20, files=50, years=3, seed=0, churn=20, files_per_commit=1):
+    """
+    Create a bare git repository at `path` with a synthetic history
+
+    Parameters:
+    -----------
+    path : str
+        Directory for the new bare repository
+    commits : int
+        Number of commits on the default branch
+    authors : int
+        Number of distinct authors, with a few doing most of the work, each
+        active for part of the history
+    files : int
+        Number of source files that commits change
+    years : int
+        Length of the history, ending now
+    seed : int
+        Random seed, so the same arguments give the same repository
+    churn : int
+        Most functions (two lines each) added to a file by a commit, which also
+        rewrites up to `churn // 4` existing lines
+    files_per_commit : int
+        Number of files each commit changes
+
+    Returns:
+    --------
+    str
+        Path to the repository
+    """
+    rng = random.Random(seed)
+    subprocess.run(['git', 'init', '-q', '--bare', '-b', 'main', path], check=True)
+
+    end = int(time.time())
+    span = years * 365 * 24 * 3600
+    start = end - span
+    # A project life cycle: authors join early more often than late, stay active
+    # for a while and leave, so monthly contributors rise and then fall
+    joins = [start + rng.betavariate(2, 4) * span for _ in range(authors)]
+    leaves = [min(end, join + rng.uniform(0.2, 0.6) * span) for join in joins]
+    # Zipf-like activity: the first authors make most of the commits
+    weights = [1 / (k + 1) for k in range(authors)]
+    history = []
+    for _ in range(commits):
+        a = rng.choices(range(authors), weights)[0]
+        history.append((int(rng.uniform(joins[a], leaves[a])), a))
+    history.sort()
+    contents = {}
+
+    stream = []
+    for n, (date, a) in enumerate(history, start=1):
+        changes = []
+        for _ in range(files_per_commit):
+            name = f"src/module_{rng.randrange(files)}.py"
+            lines = contents.setdefault(name, [])
+            # Replace a few lines and add some new ones
+            for _ in range(min(len(lines), rng.randint(0, churn // 4))):
+                lines[rng.randrange(len(lines))] = f"value_{rng.randrange(10**6)} = {rng.random()!r}"
+            lines.extend(f"def f_{n}_{k}(x):\n    return x * {k}" for k in range(rng.randint(1, churn)))
+            data = ("\n".join(lines) + "\n").encode()
+            changes.append(f"M 100644 inline {name}\n".encode() + f"data {len(data)}\n".encode() + data + b"\n")
+        message = f"Change {name} ({n})\n".encode()
+        ident = f"Author {a} <author{a}@example.com> {date} +0000"
+        stream.append(b"commit refs/heads/main\n")
+        stream.append(f"author {ident}\ncommitter {ident}\n".encode())
+        stream.append(f"data {len(message)}\n".encode() + message)
+        stream.extend(changes)
+
+    subprocess.run(['git', '-C', path, 'fast-import', '--quiet'],
+                   input=b"".join(stream), check=True)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a synthetic git repository")
+    parser.add_argument('path')
+    parser.add_argument('--commits', type=int, default=500)
+    parser.add_argument('--authors', type=int, default=20)
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--churn', type=int, default=20, help="most functions added per file changed")
+    parser.add_argument('--files-per-commit', type=int, default=1)
+    args = parser.parse_args()
+    make_repo(args.path, args.commits, args.authors, args.files, args.years, args.seed,
+              args.churn, args.files_per_commit)
+    print(f"Created {args.path}", file=sys.stderr)
@@ -3,8 +3,21 @@ import re
 import pandas as pd
 import numpy as np
 import sys
+import argparse
+import random
+import threading
+import time
 import boto3
+import hashlib
 import json
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from summary_cache import SummaryCache, summary_key
+import commit_store
+
+# Columns of the commits file that the report needs
+ACTIVITY_COLUMNS = ['hash', 'author', 'date', 'message']
 
 
 def make_activity_df(monthly_commits_file_w_desc, month):
@@ -18,12 +31,9 @@ def make_activity_df(monthly_commits_file_w_desc, month):
     month : str
         Month to generate the report for
     """
-    # Load the data
-    df = pd.read_csv(monthly_commits_file_w_desc)
-    
-    # Filter by month
-    df['YYYY-MM'] = [j[:7] for j in df['date']]
-    df = df[df['YYYY-MM'] == month]
+    # Load only that month's partition of the commit store, and only the
+    # columns the report uses
+    df = commit_store.load_month(monthly_commits_file_w_desc, month, ACTIVITY_COLUMNS)
     
     # Save to CSV
     output_file = 'data/' + month + '-activity-report.csv'
@@ -33,17 +43,60 @@ def make_activity_df(monthly_commits_file_w_desc, month):
     return df
 
 
-def call_claude(prompt):
-    # Create a Bedrock Runtime client
-    bedrock_runtime = boto3.client(
-        service_name='bedrock-runtime', 
-        region_name='us-west-2'  # adjust region as needed
-    )
+MODEL_ID = 'anthropic.claude-3-5-haiku-20241022-v1:0'
+REGION = 'us-west-2'  # adjust region as needed
+
+# Set BEDROCK_ENDPOINT_URL to send requests elsewhere, e.g. a local fake model
+# server for testing (benchmarks/fake_bedrock.py)
+ENDPOINT_URL = os.environ.get('BEDROCK_ENDPOINT_URL')
+
+# Number of model calls in flight at once
+DEFAULT_CONCURRENCY = 8
+
+# Retries with exponential backoff and jitter when the model is throttled
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0   # seconds
+BACKOFF_MAX = 30.0   # seconds
+RETRYABLE_ERRORS = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+    'InternalServerException',
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(max_connections=DEFAULT_CONCURRENCY):
+    """
+    Returns the Bedrock Runtime client shared by all calls, created on first use
+    with a connection pool large enough for `max_connections` concurrent calls
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            config = Config(
+                max_pool_connections=max(10, max_connections),
+                retries={'max_attempts': 0},  # call_claude does its own backoff
+            )
+            _client = boto3.client(
+                service_name='bedrock-runtime', 
+                region_name=REGION,
+                endpoint_url=ENDPOINT_URL,
+                config=config
+            )
+        return _client
+
+
+def call_claude(prompt, max_tokens=1000):
+    bedrock_runtime = get_client()
     
     # Prepare the request payload
     body = json.dumps({
         "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 1000,
+        "max_tokens": max_tokens,
         "messages": [
             {
                 "role": "user",
@@ -54,80 +107,238 @@ def call_claude(prompt):
         "top_p": 0.9
     })
     
-    # Make the API call
-    try:
-        response = bedrock_runtime.invoke_model(
-            modelId='anthropic.claude-3-5-haiku-20241022-v1:0',
-            body=body,
-            contentType='application/json',
-            accept='application/json'
-        )
+    # Make the API call, backing off while throttled
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = bedrock_runtime.invoke_model(
+                modelId=MODEL_ID,
+                body=body,
+                contentType='application/json',
+                accept='application/json'
+            )
+            
+            # Parse the response
+            response_body = json.loads(response['body'].read())
+            return response_body['content'][0]['text']
+
+        except ClientError as e:
+            if e.response['Error']['Code'] in RETRYABLE_ERRORS and attempt < MAX_RETRIES:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt)
+                time.sleep(random.uniform(delay / 2, delay))
+                continue
+            print(f"An error occurred: {e}")
+            return None
         
-        # Parse the response
-        response_body = json.loads(response['body'].read())
-        return response_body['content'][0]['text']
-    
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            return None
 
-PROMPT = """Combine the following text into a single summary paragraph, 
-            retaining the first line as the title with no line return. 
+PROMPT = """Below are numbered texts. Combine each text into a single summary paragraph, 
+            retaining its first line as the title with no line return. 
             Remove any sentences that contain the string 'commit'. 
             Drop any lines that begin with SHA256.
             Do not say "Here's the summary paragraph:"
             Do not leave a line after the title.
             Don't use the words "pull request"
-            Text: """
-
-def make_activity_report(df):
-    all_text = []
-    df = df[['author','message']]
-    i = 0
-    for j in range(len(df)):
-        if df["author"].iloc[j] != "pre-commit-ci[bot]":
-            i += 1
-            author = df["author"].iloc[j]
-            msg = df["message"].iloc[j]
-            prompt = PROMPT
-            text = prompt + msg
-            response = call_claude(text)
-            response = response.replace("\n", ". ")
-            print(f"{i}. {response}", end='\n\n')
-            all_text.append(response)
-    all_text = "\n\n".join(all_text)
-    prompt = """Summarize the main points of the following text."""
-    response = call_claude(prompt + all_text)
-    response = response.replace("\n", ". ")
+            Write exactly one line per text, starting with its number in square brackets, e.g. [3].
+            Texts: """
+
+ROLLUP_PROMPT = """Summarize the main points of the following text."""
+
+# Cached summaries are keyed on these, so editing a prompt or switching
+# models never reuses summaries made the old way
+PROMPT_VERSION = hashlib.sha256(PROMPT.encode()).hexdigest()[:12]
+ROLLUP_PROMPT_VERSION = hashlib.sha256(ROLLUP_PROMPT.encode()).hexdigest()[:12]
+
+# Most prompt tokens sent in one call, besides the instructions. Commit
+# messages are packed into calls up to this budget, and summaries are reduced
+# in a tree of calls that each stay within it
+TOKEN_BUDGET = 6000
+# Most commits per call, which bounds the length of the answer
+MAX_BATCH_COMMITS = 40
+BATCH_MAX_TOKENS = 4096
+
+
+def estimate_tokens(text):
+    """Rough token count, about four characters per token"""
+    return len(text) // 4 + 1
+
+
+def truncate_tokens(text, tokens):
+    """Cut `text` so that its estimated tokens are at most `tokens`"""
+    return text if estimate_tokens(text) <= tokens else text[:tokens * 4 - 1]
+
+
+def pack(texts, budget, max_items=None):
+    """
+    Split `texts` into consecutive groups whose estimated tokens stay within
+    `budget`, with at most `max_items` per group
+    """
+    groups, group, used = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if group and (used + tokens > budget or len(group) == max_items):
+            groups.append(group)
+            group, used = [], 0
+        group.append(text)
+        used += tokens
+    if group:
+        groups.append(group)
+    return groups
+
+
+_stats_lock = threading.Lock()
+
+
+def record_call(stats, prompt):
+    """Count a model call and track the largest prompt sent"""
+    with _stats_lock:
+        stats['calls'] += 1
+        stats['peak_prompt_tokens'] = max(stats['peak_prompt_tokens'], estimate_tokens(prompt))
+
+
+def summarize_batch(messages):
+    """
+    Summarize several commit messages in one call. Returns one summary per
+    message, None for any the answer left out
+    """
+    texts = "\n\n".join(f"[{n}] {msg}" for n, msg in enumerate(messages, start=1))
+    response = call_claude(PROMPT + "\n" + texts, max_tokens=BATCH_MAX_TOKENS)
+    summaries = [None] * len(messages)
+    for line in (response or "").splitlines():
+        m = re.match(r'\s*\[(\d+)\]\s*(.+)', line)
+        if m and 1 <= int(m.group(1)) <= len(messages):
+            summaries[int(m.group(1)) - 1] = m.group(2).strip()
+    return summaries
+
+
+def reduce_summaries(summaries, executor, cache=None, stats=None):
+    """
+    Reduce summaries to one in a tree: pack them into calls within the token
+    budget, summarize each call's group, and repeat on the results. Each
+    summary is cut to at most half the budget, so a call always fits two and
+    every level at least halves the count. Returns None if any call fails,
+    rather than a summary that leaves part of the month out
+    """
+    texts = [truncate_tokens(s, TOKEN_BUDGET // 2) for s in summaries]
+    if not texts:
+        return None
+
+    def reduce(group):
+        text = "\n\n".join(group)
+        key = summary_key('reduce', ROLLUP_PROMPT_VERSION, MODEL_ID, text)
+        summary = cache.get(key) if cache is not None else None
+        if summary is None:
+            record_call(stats, ROLLUP_PROMPT + text)
+            summary = call_claude(ROLLUP_PROMPT + text)
+            if summary is None:
+                return None
+            summary = summary.replace("\n", ". ")
+            if cache is not None:
+                cache.put(key, 'reduce', summary)
+        return truncate_tokens(summary, TOKEN_BUDGET // 2)
+
+    while True:
+        groups = pack(texts, TOKEN_BUDGET)
+        texts = list(executor.map(reduce, groups))
+        if None in texts:
+            return None
+        if len(texts) == 1:
+            return texts[0]
+
+
+def make_activity_report(df, concurrency=DEFAULT_CONCURRENCY, cache=None):
+    """
+    Summarizes the commits of the month with the model, then summarizes the
+    main points of all the commit summaries.
+    Commit messages are packed into calls up to TOKEN_BUDGET tokens (and
+    MAX_BATCH_COMMITS commits), run `concurrency` at a time, and the summaries
+    are reduced in a tree of calls within the same budget, so both the number
+    of calls and the largest prompt stay bounded on busy months.
+    Summaries are printed in commit order whatever order the calls finish in.
+    With a `SummaryCache`, commits and months summarized before are not sent
+    to the model again; a month is only cached once every commit in it has
+    a summary
+    """
+    df = df[['hash','author','message']]
+    df = df[df["author"] != "pre-commit-ci[bot]"]
+    hashes = list(df["hash"])
+    messages = [truncate_tokens(str(m), TOKEN_BUDGET) for m in df["message"]]
+    stats = {'calls': 0, 'peak_prompt_tokens': 0}
+
+    # Reuse cached commit summaries and batch up the rest
+    summaries = [None] * len(hashes)
+    keys = [summary_key('commit', PROMPT_VERSION, MODEL_ID, h) for h in hashes]
+    if cache is not None:
+        summaries = [cache.get(key) for key in keys]
+    todo = [i for i, summary in enumerate(summaries) if summary is None]
+    batches = []
+    for group in pack([messages[i] for i in todo], TOKEN_BUDGET, MAX_BATCH_COMMITS):
+        batches.append(todo[:len(group)])
+        todo = todo[len(group):]
+
+    get_client(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        def run_batch(batch):
+            record_call(stats, PROMPT + "\n\n".join(messages[i] for i in batch))
+            return summarize_batch([messages[i] for i in batch])
+
+        for batch, results in zip(batches, executor.map(run_batch, batches)):
+            for i, summary in zip(batch, results):
+                summaries[i] = summary
+                if summary is not None and cache is not None:
+                    cache.put(keys[i], 'commit', summary)
+
+        all_text = []
+        for i, summary in enumerate(summaries, start=1):
+            if summary is None:
+                print(f"{i}. (no summary)", end='\n\n')
+                continue
+            print(f"{i}. {summary}", end='\n\n')
+            all_text.append(summary)
+
+        key = summary_key('rollup', ROLLUP_PROMPT_VERSION, PROMPT_VERSION, MODEL_ID, *sorted(hashes))
+        response = cache.get(key) if cache is not None else None
+        if response is None and all_text:
+            response = reduce_summaries(all_text, executor, cache, stats)
+            # A rollup missing some commits is shown but not kept, so that a
+            # later run summarizes those commits and rolls up the whole month
+            if response is not None and cache is not None and len(all_text) == len(summaries):
+                cache.put(key, 'rollup', response)
     print(f"{response}")
-    return None
+    print(f"Model calls: {stats['calls']}, largest prompt: ~{stats['peak_prompt_tokens']} tokens")
+    return response
 
 
-# Main run
-if __name__ == "__main__":
+def main(argv=None):
     """
     To run: 
     First, collect the repo data by running from the root folder:
         python src/github_gather.py <owner>/<repo>
 
     Next, run
-        python src/activity_report.py <owner>/<repo> YYYY-MM (from root folder)
+        python src/activity_report.py <owner>/<repo> YYYY-MM [--concurrency N] (from root folder)
     """
-    if len(sys.argv) < 3:
-        print("Please provide a GitHub repository name in format `<owner>/<repo> YYYY-MM`> .")
-        # EXAMPLES
-        # repo_name = 'jupyterlab/jupyter-ai'
-        # repo_name = 'jupyter-server/jupyter-scheduler'
-        # repo_name = 'pandas-dev/pandas'
-        # repo_name = 'jupyterlab/jupyterlab'
-        # repo_name = 'langchain-ai/langchain'
-        # repo_name = 'langchain-ai/langchain-aws'        
-    else:  
-        repo_name = sys.argv[1]
-        owner, repo = repo_name.split('/')
-        repo_string = owner + '-' + repo
-        month = sys.argv[2]
-        print(f"Owner: {owner} | Repo: {repo}")
-        commits_file = 'data/' + repo_string + '-commits_w_desc.csv'
-        df = make_activity_df(commits_file, month)
-        make_activity_report(df)
+    parser = argparse.ArgumentParser(description="Summarize a month of commits with a LLM")
+    parser.add_argument('repo_name', help="GitHub repository in format <owner>/<repo>")
+    parser.add_argument('month', help="month to report on, as YYYY-MM")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="number of model calls in flight at once")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="summarize every commit again instead of reusing cached summaries")
+    args = parser.parse_args(argv)
+
+    repo_name = args.repo_name
+    owner, repo = repo_name.split('/')
+    repo_string = owner + '-' + repo
+    month = args.month
+    print(f"Owner: {owner} | Repo: {repo}")
+    commits_file = 'data/' + repo_string + '-commits_w_desc.csv'
+    df = make_activity_df(commits_file, month)
+    cache = None if args.no_cache else SummaryCache()
+    make_activity_report(df, concurrency=args.concurrency, cache=cache)
+
+
+# Main run
+if __name__ == "__main__":
+    main()
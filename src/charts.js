@@ -0,0 +1,186 @@
+// Line charts for the model results, drawn on a canvas.
+// Scroll to zoom along the time axis, drag to pan, double-click to reset.
+
+const CHART_COLORS = ['#007bff', '#dc3545', '#28a745', '#fd7e14', '#6f42c1', '#20c997', '#6c757d'];
+
+// Label for month `i` counted from `start` ('YYYY-MM')
+function monthLabel(start, i) {
+    const [year, month] = start.split('-').map(Number);
+    const m = (month - 1) + i;
+    const y = year + Math.floor(m / 12);
+    return `${y}-${String(((m % 12) + 12) % 12 + 1).padStart(2, '0')}`;
+}
+
+class LineChart {
+    constructor(canvas, { title = '', xLabel = '', startMonth = null } = {}) {
+        this.canvas = canvas;
+        this.ctx = canvas.getContext('2d');
+        this.title = title;
+        this.xLabel = xLabel;
+        this.startMonth = startMonth;
+        this.series = [];
+        this.view = null;
+        this.margin = { top: 30, right: 15, bottom: 40, left: 55 };
+
+        canvas.addEventListener('wheel', e => this.onWheel(e), { passive: false });
+        canvas.addEventListener('mousedown', e => { this.dragFrom = this.canvasX(e); });
+        canvas.addEventListener('mousemove', e => this.onDrag(e));
+        window.addEventListener('mouseup', () => { this.dragFrom = null; });
+        canvas.addEventListener('dblclick', () => { this.view = null; this.draw(); });
+    }
+
+    // Each series is { name, y, x0 = 0, color, dashed, points }, where x0 is the
+    // month index of y[0]
+    setSeries(series) {
+        this.series = series;
+        this.view = null;
+        this.draw();
+    }
+
+    // Overlay more series, e.g. another repository to compare against
+    addSeries(series) {
+        this.series = this.series.concat(series);
+        this.draw();
+    }
+
+    fullRange() {
+        let xMin = Infinity, xMax = -Infinity;
+        for (const s of this.series) {
+            const x0 = s.x0 || 0;
+            xMin = Math.min(xMin, x0);
+            xMax = Math.max(xMax, x0 + s.y.length - 1);
+        }
+        return [xMin, xMax];
+    }
+
+    xRange() {
+        return this.view || this.fullRange();
+    }
+
+    yRange([xMin, xMax]) {
+        let yMin = Infinity, yMax = -Infinity;
+        for (const s of this.series) {
+            const x0 = s.x0 || 0;
+            for (let i = Math.max(0, Math.floor(xMin - x0)); i < s.y.length && x0 + i <= xMax; i++) {
+                if (Number.isFinite(s.y[i])) {
+                    yMin = Math.min(yMin, s.y[i]);
+                    yMax = Math.max(yMax, s.y[i]);
+                }
+            }
+        }
+        if (!Number.isFinite(yMin)) return [0, 1];
+        if (yMin === yMax) return [yMin - 1, yMax + 1];
+        return [Math.min(0, yMin), yMax];
+    }
+
+    plotWidth() {
+        return this.canvas.width - this.margin.left - this.margin.right;
+    }
+
+    // Mouse x position in canvas pixels, allowing for CSS scaling of the canvas
+    canvasX(e) {
+        return e.offsetX * this.canvas.width / (this.canvas.clientWidth || this.canvas.width);
+    }
+
+    onWheel(e) {
+        e.preventDefault();
+        const [xMin, xMax] = this.xRange();
+        const [fullMin, fullMax] = this.fullRange();
+        const frac = Math.min(1, Math.max(0, (this.canvasX(e) - this.margin.left) / this.plotWidth()));
+        const center = xMin + frac * (xMax - xMin);
+        const scale = e.deltaY < 0 ? 0.8 : 1.25;
+        const span = Math.min(fullMax - fullMin, Math.max(6, (xMax - xMin) * scale));
+        let lo = center - frac * span;
+        lo = Math.max(fullMin, Math.min(lo, fullMax - span));
+        this.view = [lo, lo + span];
+        this.draw();
+    }
+
+    onDrag(e) {
+        if (this.dragFrom == null || !this.view) return;
+        const [xMin, xMax] = this.view;
+        const [fullMin, fullMax] = this.fullRange();
+        const shift = (this.dragFrom - this.canvasX(e)) / this.plotWidth() * (xMax - xMin);
+        const lo = Math.max(fullMin, Math.min(xMin + shift, fullMax - (xMax - xMin)));
+        this.view = [lo, lo + (xMax - xMin)];
+        this.dragFrom = this.canvasX(e);
+        this.draw();
+    }
+
+    draw() {
+        const { ctx, canvas, margin } = this;
+        const w = this.plotWidth();
+        const h = canvas.height - margin.top - margin.bottom;
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        if (this.series.length === 0) return;
+
+        const [xMin, xMax] = this.xRange();
+        const [yMin, yMax] = this.yRange([xMin, xMax]);
+        const px = x => margin.left + (x - xMin) / ((xMax - xMin) || 1) * w;
+        const py = y => margin.top + h - (y - yMin) / (yMax - yMin) * h;
+
+        // Axes, grid and tick labels
+        ctx.font = '11px Arial';
+        ctx.strokeStyle = '#e5e5e5';
+        ctx.fillStyle = '#333';
+        ctx.lineWidth = 1;
+        ctx.setLineDash([]);
+        for (let k = 0; k <= 4; k++) {
+            const y = yMin + (yMax - yMin) * k / 4;
+            ctx.beginPath();
+            ctx.moveTo(margin.left, py(y));
+            ctx.lineTo(margin.left + w, py(y));
+            ctx.stroke();
+            ctx.textAlign = 'right';
+            ctx.fillText(Math.abs(y) >= 1e4 ? y.toExponential(1) : y.toFixed(y % 1 ? 1 : 0), margin.left - 5, py(y) + 4);
+        }
+        ctx.textAlign = 'center';
+        for (let k = 0; k <= 4; k++) {
+            const x = Math.round(xMin + (xMax - xMin) * k / 4);
+            const label = this.startMonth ? monthLabel(this.startMonth, x) : String(x);
+            ctx.fillText(label, px(x), margin.top + h + 15);
+        }
+        ctx.fillText(this.xLabel, margin.left + w / 2, canvas.height - 5);
+        ctx.font = 'bold 12px Arial';
+        ctx.fillText(this.title, canvas.width / 2, 15);
+
+        // Series, clipped to the plot area
+        ctx.save();
+        ctx.beginPath();
+        ctx.rect(margin.left, margin.top, w, h);
+        ctx.clip();
+        this.series.forEach((s, n) => {
+            const color = s.color || CHART_COLORS[n % CHART_COLORS.length];
+            const x0 = s.x0 || 0;
+            ctx.strokeStyle = ctx.fillStyle = color;
+            if (s.points) {
+                s.y.forEach((y, i) => {
+                    ctx.beginPath();
+                    ctx.arc(px(x0 + i), py(y), 2, 0, 2 * Math.PI);
+                    ctx.fill();
+                });
+            } else {
+                ctx.lineWidth = 2;
+                ctx.setLineDash(s.dashed ? [6, 4] : []);
+                ctx.beginPath();
+                s.y.forEach((y, i) => {
+                    if (i === 0) ctx.moveTo(px(x0), py(y));
+                    else ctx.lineTo(px(x0 + i), py(y));
+                });
+                ctx.stroke();
+            }
+        });
+        ctx.restore();
+
+        // Legend
+        ctx.font = '11px Arial';
+        ctx.textAlign = 'left';
+        ctx.setLineDash([]);
+        this.series.forEach((s, n) => {
+            ctx.fillStyle = s.color || CHART_COLORS[n % CHART_COLORS.length];
+            ctx.fillRect(margin.left + 10, margin.top + 8 + n * 14, 10, 3);
+            ctx.fillStyle = '#333';
+            ctx.fillText(s.name, margin.left + 25, margin.top + 12 + n * 14);
+        });
+    }
+}
@@ -0,0 +1,55 @@
+"""
+The `oss-lifecycle` command, with one subcommand per tool.
+Only the standard library is imported here; each subcommand imports its module
+(and so pandas, scikit-learn, transformers, ...) when it runs, so help and
+light subcommands start quickly.
+Usage:
+    oss-lifecycle <command> [arguments]
+    oss-lifecycle <command> --help
+
+    Without installing, from the root folder:
+    python src/cli.py <command> [arguments]
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+# command: (module, description)
+COMMANDS = {
+    'gather': ('github_gather', "clone a repository and save its commit and monthly data"),
+    'bass': ('fit_bass', "fit the Bass model of developer engagement"),
+    'innovation': ('fit_innovation', "fit and forecast the innovation model"),
+    'pipeline': ('pipeline', "run gather, monthly, Bass and innovation stages that are out of date"),
+    'portfolio': ('portfolio', "fit many repositories and compare their life cycles"),
+    'rollup': ('rollups', "roll up commits by day, week, month or quarter"),
+    'downloads': ('pypi_downloads', "store and total the daily PyPI downloads of packages"),
+    'tokens': ('count_tokens', "count the code tokens in a repository"),
+    'report': ('activity_report', "summarize a month of commits with a LLM"),
+    'serve': ('server', "start the web app"),
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        prog='oss-lifecycle',
+        description="Model the life cycle of open-source projects",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<12}{description}"
+                                         for name, (_, description) in COMMANDS.items()))
+    parser.add_argument('command', choices=COMMANDS, metavar='command')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="arguments of the command")
+    args = parser.parse_args(argv[:1])
+
+    # The modules import each other by name, as when run as scripts
+    src = os.path.dirname(os.path.abspath(__file__))
+    if src not in sys.path:
+        sys.path.insert(0, src)
+    module = importlib.import_module(COMMANDS[args.command][0])
+    return module.main(argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Month-partitioned copy of a `-commits_w_desc.csv` file, so one month of commits
+can be loaded without re-parsing every commit ever made.
+The store is a folder next to the CSV file (`data/<owner>-<repo>-commits_w_desc/`)
+with one file per month, `month=YYYY-MM/part.parquet` when pyarrow is installed
+or `month=YYYY-MM/part.csv` otherwise. Loading a month opens only that month's
+file and only the columns asked for.
+Functions:
+    store_path(commits_file):
+        Folder of the store for a commits CSV file.
+    write_commit_store(df, commits_file):
+        Partitions a commits data frame by month into the store.
+    load_month(commits_file, month, columns=None):
+        Loads the commits of `month` ('YYYY-MM'), building the store from the
+        CSV file first if it is missing or older than the CSV.
+A new store is swapped in whole: the old folder is renamed aside, the new one
+renamed into place, and only then is the old one deleted.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    FORMAT = 'parquet'
+except ImportError:
+    FORMAT = 'csv'
+
+SOURCE_FILE = '_source.json'
+
+
+def store_path(commits_file):
+    return os.path.splitext(commits_file)[0]
+
+
+def _source_stamp(commits_file):
+    stat = os.stat(commits_file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'format': FORMAT}
+
+
+def write_commit_store(df, commits_file):
+    """
+    Partition the commits in `df` by the month of their (local) date and save
+    them as the store for `commits_file`
+    """
+    path = store_path(commits_file)
+    # A folder of its own, as two gathers of the same repository may write at once
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                dir=os.path.dirname(path) or '.')
+
+    # Same month as the date string written to the CSV, e.g. '2023-11-14 17:23:13+02:00'
+    months = df['date'].astype(str).str.slice(0, 7)
+    for month, part in df.groupby(months, sort=False):
+        part_dir = os.path.join(tmp_path, f'month={month}')
+        os.makedirs(part_dir)
+        if FORMAT == 'parquet':
+            part.astype({'date': str}).to_parquet(os.path.join(part_dir, 'part.parquet'), index=False)
+        else:
+            part.to_csv(os.path.join(part_dir, 'part.csv'), index=False)
+
+    if os.path.exists(commits_file):
+        with open(os.path.join(tmp_path, SOURCE_FILE), 'w') as f:
+            json.dump(_source_stamp(commits_file), f)
+    # Keep the old store until the new one is in place
+    old_path = tmp_path[:-len('.tmp')] + '.old'
+    try:
+        os.rename(path, old_path)
+    except FileNotFoundError:
+        old_path = None
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Another writer put its store in place first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    if old_path is not None:
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def _is_current(commits_file):
+    try:
+        with open(os.path.join(store_path(commits_file), SOURCE_FILE)) as f:
+            return json.load(f) == _source_stamp(commits_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+
+
+def load_month(commits_file, month, columns=None):
+    """
+    Load the commits of `month` ('YYYY-MM') from the store of `commits_file`,
+    reading only `columns` if given. Raises FileNotFoundError if the store
+    cannot be found, even after building it again
+    """
+    path = store_path(commits_file)
+    # A store being swapped by another writer is briefly missing: look twice
+    for _ in range(2):
+        if not _is_current(commits_file):
+            print(f"Indexing {commits_file} by month")
+            write_commit_store(pd.read_csv(commits_file), commits_file)
+
+        part_dir = os.path.join(path, f'month={month}')
+        try:
+            if FORMAT == 'parquet':
+                return pd.read_parquet(os.path.join(part_dir, 'part.parquet'), columns=columns)
+            return pd.read_csv(os.path.join(part_dir, 'part.csv'), usecols=columns)
+        except FileNotFoundError:
+            pass
+        if os.path.exists(os.path.join(path, SOURCE_FILE)):
+            # No commits that month: an empty frame with the expected columns
+            return pd.read_csv(commits_file, nrows=0, usecols=columns)
+    raise FileNotFoundError(f"No commit store for {commits_file} in {path}")
@@ -1,63 +1,557 @@
+"""
+Counts the code tokens in a GitHub repository.
+Files are read straight from the git object store (`git ls-tree` lists them and
+`git cat-file --batch` streams their contents), so no checkout is needed and
+untracked or ignored files are never seen. Before tokenization files are
+classified: excluded directories and extensions, files marked
+`linguist-generated`, `linguist-vendored` or `binary` in `.gitattributes`, and
+files over a size cap are skipped without being read, and binary or minified
+contents are recognized from their first bytes. Token
+counts are cached per blob SHA and tokenizer in `cache/tokens.sqlite`, so a
+recount after new commits only tokenizes the blobs that changed. New blobs are
+tokenized in batches with the fast tokenizer's batch encoding across a pool of
+worker processes, each loading the tokenizer once.
+Functions:
+    load_tokenizer(tokenizer_name=TOKENIZER):
+        Loads a Hugging Face tokenizer.
+    clone_bare(repo_url, local_path=None):
+        Clones a repository without a working tree.
+    language(path):
+        Language of a file from its name, 'Other' if unknown.
+    list_blobs(repo_path, rev='HEAD', max_bytes=MAX_FILE_BYTES, quiet=False):
+        Lists the files at a revision that are counted, with their blob SHAs.
+    sniff(data):
+        Why the contents of a file are not counted, or None for text.
+    read_blobs(repo_path, shas):
+        Streams the contents of blobs from the object store.
+    count_blobs(repo_path, shas, ...):
+        Token counts of blobs, from the cache or by tokenizing them.
+    tokenize_and_count(repo_path, rev='HEAD', ...):
+        Tokenizes all files in a repository and returns the total number of tokens.
+    snapshots(repo_path, by='month'):
+        Commits to count for a history: the last one of each month, or each tag.
+    token_history(repo_path, by='month', ...):
+        Total tokens of each snapshot, tokenizing each distinct blob only once.
+Usage:
+    python src/count_tokens.py <owner>/<repo> [--rev REV] [--workers N] [--batch-size N]
+        [--tokenizer NAME] [--no-cache] [--max-bytes N] [--history month|tag]
+
+    With --history the totals of each month (or tag) are saved to
+    data/<owner>-<repo>-tokens-monthly.csv (or -tokens-tags.csv).
+"""
+
+import argparse
+import multiprocessing
 import os
-import sys
+import posixpath
 import shutil
-from transformers import AutoTokenizer
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
 import github_gather
+from token_cache import TokenCache
+
+TOKENIZER = "huggingface/CodeBERTa-small-v1"
+
+# Files tokenized together in one batch encoding call
+BATCH_SIZE = 64
+
+# Print progress after this many files
+PROGRESS_EVERY = 1000
+
+# Files whose path has one of these directories are not counted
+SKIP_DIRS = {".git", ".yarn", "node_modules", "bower_components", "vendor",
+             "third_party", "__pycache__"}
+SKIP_EXTENSIONS = {".md", ".lock", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".pdf", ".ipynb",
+                   ".csv", ".map", ".woff", ".woff2", ".ttf", ".eot", ".zip", ".gz", ".jar"}
+SKIP_SUFFIXES = (".min.js", ".min.css", "-lock.json")
+
+# Files larger than this are not read (bytes)
+MAX_FILE_BYTES = 1024 * 1024
+
+# Contents are sniffed from this many leading bytes, like git does for binaries
+SNIFF_BYTES = 8000
+# Text with longer lines than this on average is taken as minified
+MAX_AVERAGE_LINE = 500
+
+# git attributes that mark files as not hand-written source
+ATTRIBUTES = ['binary', 'linguist-generated', 'linguist-vendored']
+
+LANGUAGES = {
+    '.py': 'Python', '.pyx': 'Python', '.pyi': 'Python',
+    '.js': 'JavaScript', '.jsx': 'JavaScript', '.mjs': 'JavaScript', '.cjs': 'JavaScript',
+    '.ts': 'TypeScript', '.tsx': 'TypeScript',
+    '.c': 'C', '.h': 'C', '.cc': 'C++', '.cpp': 'C++', '.cxx': 'C++', '.hpp': 'C++',
+    '.java': 'Java', '.kt': 'Kotlin', '.scala': 'Scala', '.go': 'Go', '.rs': 'Rust',
+    '.rb': 'Ruby', '.php': 'PHP', '.cs': 'C#', '.swift': 'Swift', '.r': 'R', '.jl': 'Julia',
+    '.sh': 'Shell', '.bash': 'Shell', '.sql': 'SQL',
+    '.html': 'HTML', '.css': 'CSS', '.scss': 'CSS', '.less': 'CSS',
+    '.json': 'JSON', '.yaml': 'YAML', '.yml': 'YAML', '.toml': 'TOML',
+    '.rst': 'reStructuredText', '.txt': 'Text',
+}
+
+_tokenizer = None
+
+
+def load_tokenizer(tokenizer_name=TOKENIZER):
+    from transformers import AutoTokenizer
+    from transformers.utils import logging
+    # Whole files are longer than the model's context, which is expected here
+    logging.set_verbosity_error()
+    return AutoTokenizer.from_pretrained(tokenizer_name)
+
+
+def _init_worker(tokenizer_name, threads):
+    """Loads the tokenizer once per worker process"""
+    global _tokenizer
+    if not threads:
+        # The pool already uses every core, so each worker encodes on one thread
+        os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+    _tokenizer = load_tokenizer(tokenizer_name)
+
+
+def _count_batch(contents):
+    """
+    Decode and tokenize a batch of file contents
+
+    Returns:
+    --------
+    list
+        Number of tokens of each file, or None for files that are not UTF-8 text
+    """
+    texts, counts = [], [None] * len(contents)
+    readable = []
+    for k, data in enumerate(contents):
+        try:
+            texts.append(data.decode("utf-8"))
+            readable.append(k)
+        except UnicodeDecodeError:
+            pass
+    if texts:
+        encoded = _tokenizer(texts, truncation=False)['input_ids']
+        for k, ids in zip(readable, encoded):
+            counts[k] = len(ids)
+    return counts
+
+
+def clone_bare(repo_url, local_path=None):
+    """
+    Clone a repository's history without checking out a working tree
+
+    Parameters:
+    -----------
+    repo_url : str
+        URL of the repository
+    local_path : str, optional
+        Where to clone it. If None, '<repo>.git' in the current directory
+
+    Returns:
+    --------
+    str
+        Path to the repository
+    """
+    if local_path is None:
+        local_path = os.path.join(os.getcwd(), repo_url.split('/')[-1].replace('.git', '') + '.git')
+    if os.path.exists(local_path):
+        print(f"Directory {local_path} already exists. Skipping clone.")
+    else:
+        subprocess.run(['git', 'clone', '--bare', '--quiet', repo_url, local_path], check=True)
+        print(f"Repository cloned to {local_path}")
+    return local_path
+
+
+def language(path):
+    return LANGUAGES.get(posixpath.splitext(path)[1].lower(), 'Other')
+
+
+def _excluded(path):
+    """Whether a file is excluded by its path alone"""
+    parts = path.split('/')
+    name = parts[-1].lower()
+    return (any(part in SKIP_DIRS for part in parts[:-1])
+            or posixpath.splitext(name)[1] in SKIP_EXTENSIONS
+            or name.endswith(SKIP_SUFFIXES))
+
+
+def _flagged_paths(repo_path, rev, paths):
+    """
+    Paths marked `binary`, `linguist-generated` or `linguist-vendored` by the
+    .gitattributes files at `rev`, read through a temporary index so that no
+    checkout is needed
+    """
+    git = ['git', '-C', repo_path]
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, GIT_INDEX_FILE=os.path.join(tmp, 'index'))
+        subprocess.run(git + ['read-tree', rev], env=env, check=True)
+        out = subprocess.run(git + ['check-attr', '--cached', '--stdin', '-z', *ATTRIBUTES],
+                             input='\0'.join(paths).encode('utf-8', 'surrogateescape'),
+                             env=env, capture_output=True, check=True).stdout
+    # Output is <path> NUL <attribute> NUL <value> NUL for each path and attribute
+    fields = out.split(b'\0')
+    flagged = set()
+    for k in range(0, len(fields) - 2, 3):
+        if fields[k + 2] not in (b'unspecified', b'unset', b'false'):
+            flagged.add(fields[k].decode('utf-8', 'surrogateescape'))
+    return flagged
+
+
+def list_blobs(repo_path, rev='HEAD', max_bytes=MAX_FILE_BYTES, quiet=False):
+    """
+    Files at revision `rev` to count, skipping those that are excluded by their
+    path, by .gitattributes or by their size
+
+    Returns:
+    --------
+    list
+        (path, blob SHA, size in bytes) of each file
+    """
+    out = subprocess.run(['git', '-C', repo_path, 'ls-tree', '-r', '-l', '-z', rev],
+                         capture_output=True, check=True).stdout
+    entries = []
+    for entry in out.split(b'\0'):
+        if not entry:
+            continue
+        meta, path = entry.split(b'\t', 1)
+        mode, kind, sha, size = meta.split()
+        # Skip submodules and symbolic links
+        if kind != b'blob' or mode == b'120000':
+            continue
+        entries.append((path.decode('utf-8', 'surrogateescape'), sha.decode(), int(size)))
+
+    skipped = Counter()
+    blobs = []
+    for path, sha, size in entries:
+        if _excluded(path):
+            skipped['excluded path'] += 1
+        elif size > max_bytes:
+            skipped['too large'] += 1
+        else:
+            blobs.append((path, sha, size))
+    if any(posixpath.basename(path) == '.gitattributes' for path, _, _ in entries):
+        flagged = _flagged_paths(repo_path, rev, [path for path, _, _ in blobs])
+        skipped['binary, generated or vendored'] = len(flagged)
+        blobs = [blob for blob in blobs if blob[0] not in flagged]
+
+    if not quiet:
+        reasons = ", ".join(f"{n} {reason}" for reason, n in skipped.items() if n)
+        print(f"{len(blobs)} of {len(entries)} files to count" + (f" (skipped {reasons})" if reasons else ""))
+    return blobs
+
+
+def sniff(data):
+    """
+    Why the contents of a file are not counted, from its first bytes
+
+    Returns:
+    --------
+    str
+        'binary' if there is a NUL byte, 'minified' for very long lines, else None
+    """
+    head = data[:SNIFF_BYTES]
+    if b'\0' in head:
+        return 'binary'
+    if len(head) == SNIFF_BYTES and head.count(b'\n') < SNIFF_BYTES // MAX_AVERAGE_LINE:
+        return 'minified'
+    return None
 
-def tokenize_and_count(repo_path):
+
+def read_blobs(repo_path, shas):
+    """
+    Stream the contents of blobs through one `git cat-file --batch` process
+
+    Yields:
+    -------
+    tuple
+        (blob SHA, contents as bytes), in the order of `shas`
+    """
+    proc = subprocess.Popen(['git', '-C', repo_path, 'cat-file', '--batch'],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def request():
+        # Written from a thread so a full stdout pipe cannot block the requests
+        try:
+            for sha in shas:
+                proc.stdin.write(sha.encode() + b'\n')
+        finally:
+            proc.stdin.close()
+
+    writer = threading.Thread(target=request, daemon=True)
+    writer.start()
+    try:
+        while True:
+            header = proc.stdout.readline()
+            if not header:
+                break
+            fields = header.split()
+            if fields[1] == b'missing':
+                continue
+            size = int(fields[2])
+            data = proc.stdout.read(size)
+            proc.stdout.read(1)  # trailing newline
+            yield fields[0].decode(), data
+    finally:
+        proc.stdout.close()
+        proc.wait()
+        writer.join()
+
+
+def _batches(blobs, batch_size):
+    shas, contents = [], []
+    for sha, data in blobs:
+        shas.append(sha)
+        contents.append(data)
+        if len(shas) == batch_size:
+            yield shas, contents
+            shas, contents = [], []
+    if shas:
+        yield shas, contents
+
+
+def _tokenize(blobs, workers, batch_size, tokenizer_name):
+    """Yield the token counts of the batches of (sha, contents) as they are tokenized"""
+    batches = _batches(blobs, batch_size)
+    if workers == 1:
+        _init_worker(tokenizer_name, threads=True)
+        for batch_shas, contents in batches:
+            yield batch_shas, _count_batch(contents)
+        return
+
+    # Spawned rather than forked workers, which would inherit the pipe to
+    # `git cat-file` and keep it from seeing the end of the requests
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(tokenizer_name, False)) as executor:
+        # A few batches in flight per worker, so contents are not all read into memory
+        pending = deque()
+        for batch_shas, contents in batches:
+            pending.append((batch_shas, executor.submit(_count_batch, contents)))
+            if len(pending) >= 2 * workers:
+                batch_shas, future = pending.popleft()
+                yield batch_shas, future.result()
+        for batch_shas, future in pending:
+            yield batch_shas, future.result()
+
+
+def count_blobs(repo_path, shas, workers=None, batch_size=BATCH_SIZE,
+                tokenizer_name=TOKENIZER, cache=None):
+    """
+    Token counts of blobs, taken from `cache` where known and tokenized otherwise
+
+    Parameters:
+    -----------
+    repo_path : str
+        Path to the local repository, bare or not
+    shas : iterable
+        Blob SHAs to count
+    workers : int, optional
+        Worker processes, default one per core. With 1 the blobs are tokenized
+        in this process
+    batch_size : int
+        Blobs per batch encoding call
+    tokenizer_name : str
+        Hugging Face tokenizer name or local path
+    cache : TokenCache, optional
+        Cache of counts by blob SHA, updated with the new counts
+
+    Returns:
+    --------
+    dict
+        Tokens of each blob, None for blobs that are binary, minified or not UTF-8
+    """
+    workers = workers or os.cpu_count()
+    shas = set(shas)
+    counts = cache.get_many(shas, tokenizer_name) if cache else {}
+    missing = sorted(shas - counts.keys())
+    print(f"{len(shas) - len(missing)} of {len(shas)} distinct blobs cached", flush=True)
+
+    # Binary and minified contents are recognized here and never sent to the workers
+    sniffed, reasons = {}, Counter()
+
+    def text_blobs():
+        for sha, data in read_blobs(repo_path, missing):
+            reason = sniff(data)
+            if reason:
+                sniffed[sha] = None
+                reasons[reason] += 1
+            else:
+                yield sha, data
+
+    done = 0
+    for batch_shas, batch_counts in _tokenize(text_blobs(), workers, batch_size, tokenizer_name):
+        new = dict(zip(batch_shas, batch_counts))
+        counts.update(new)
+        if cache:
+            cache.put_many(new, tokenizer_name)
+        done += len(batch_shas)
+        if done // PROGRESS_EVERY > (done - len(batch_shas)) // PROGRESS_EVERY:
+            print(f"Tokenized {done} of {len(missing)} new files", flush=True)
+
+    counts.update(sniffed)
+    if cache:
+        cache.put_many(sniffed, tokenizer_name)
+    if reasons:
+        print("Not tokenized: " + ", ".join(f"{n} {reason}" for reason, n in reasons.items()))
+    return counts
+
+
+def tokenize_and_count(repo_path, rev='HEAD', workers=None, batch_size=BATCH_SIZE,
+                       tokenizer_name=TOKENIZER, cache=None, max_bytes=MAX_FILE_BYTES):
     """
     Tokenizes all files in a GitHub repository and counts the total number of tokens.
 
     Args:
-        repo_path (str): Path to the local GitHub repository.
+        repo_path (str): Path to the local GitHub repository, bare or not.
+        rev (str): Revision to count, by default the current HEAD.
+        workers (int): Worker processes, default one per core.
+        batch_size (int): Files per batch encoding call.
+        tokenizer_name (str): Hugging Face tokenizer name or local path.
+        cache (TokenCache): Cache of counts by blob SHA, if any.
+        max_bytes (int): Files larger than this are skipped.
 
     Returns:
         int: Total number of tokens in the repository.
     """
-    # Load the StarCoder2 tokenizer
-    tokenizer = AutoTokenizer.from_pretrained("huggingface/CodeBERTa-small-v1")
+    start = time.perf_counter()
+    blobs = list_blobs(repo_path, rev, max_bytes)
+    counts = count_blobs(repo_path, (sha for _, sha, _ in blobs), workers, batch_size,
+                         tokenizer_name, cache)
 
-    total_tokens = 0
-
-    # Walk through all files in the repository
-    for root, _, files in os.walk(repo_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            if any(substring in file_path for substring in [".md", ".lock", ".png", ".jpeg", ".ipynb", ".git", "yarn", ".csv"]):
-                # Skip non-code files
-                print(f"Skipping file: {file_path}")
-            else:
-                try:
-                    # Read the file content
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                    
-                    # Tokenize the content and count tokens
-                    tokens = tokenizer.encode(content, truncation=False)
-                    total_tokens += len(tokens)
-                    print(f"File: {file_path}, Tokens: {len(tokens)}")
-                except (UnicodeDecodeError, FileNotFoundError):
-                    # Skip files that cannot be read
-                    print(f"Skipping file: {file_path}")
+    # A blob at several paths counts at each of them
+    total_tokens = sum(counts[sha] or 0 for _, sha, _ in blobs)
+    files = sum(1 for _, sha, _ in blobs if counts[sha] is not None)
+    elapsed = time.perf_counter() - start
+    print(f"Counted {files} files ({len(blobs) - files} not text) "
+          f"in {elapsed:.1f}s: {files / elapsed:.0f} files/s, {total_tokens / elapsed:.0f} tokens/s")
 
+    by_language = pd.DataFrame(
+        [(language(path), counts[sha]) for path, sha, _ in blobs if counts[sha] is not None],
+        columns=['language', 'tokens'])
+    by_language = by_language.groupby('language')['tokens'].agg(files='count', tokens='sum')
+    print(by_language.sort_values('tokens', ascending=False).to_string())
     return total_tokens
 
 
-# Main run
-if __name__ == "__main__":
+def snapshots(repo_path, by='month'):
+    """
+    Commits whose trees make up a token history
+
+    Parameters:
+    -----------
+    repo_path : str
+        Path to the local repository
+    by : str
+        'month' for the state of the default branch at the end of each month,
+        from its first commit to its last, or 'tag' for every tag
+
+    Returns:
+    --------
+    pandas.DataFrame
+        'date' and 'commit' of each snapshot (and 'tag' with by='tag'), oldest first
     """
-    To run: 
+    git = ['git', '-C', repo_path]
+    if by == 'tag':
+        out = subprocess.run(git + ['for-each-ref', '--sort=creatordate',
+                                    '--format=%(refname:short) %(objectname) %(*objectname) %(creatordate:unix)',
+                                    'refs/tags'],
+                             capture_output=True, text=True, check=True).stdout
+        rows = []
+        for line in out.splitlines():
+            fields = line.split()
+            # Annotated tags point to a tag object, peeled to its commit in %(*objectname)
+            tag, commit, date = fields[0], fields[-2] if len(fields) == 4 else fields[1], fields[-1]
+            rows.append({'tag': tag, 'date': pd.Timestamp(int(date), unit='s', tz='UTC'), 'commit': commit})
+        return pd.DataFrame(rows, columns=['tag', 'date', 'commit'])
+
+    out = subprocess.run(git + ['log', '--first-parent', '--reverse', '--format=%H %ct', 'HEAD'],
+                         capture_output=True, text=True, check=True).stdout.split()
+    commits = np.array(out[0::2])
+    # Committer times need not increase along the history (rebases, cherry-picks,
+    # clock skew). A commit counts as made no earlier than those before it, so
+    # the times are sorted and each month end gets the last commit such that
+    # it and all before it were made by then
+    times = np.maximum.accumulate(np.array(out[1::2], dtype=np.int64))
+    times = pd.to_datetime(times, unit='s', utc=True)
+    # Month ends as in -monthly.csv, each with the last commit before the next month starts
+    month_ends = pd.date_range(times.min().normalize(), times.max() + pd.offsets.MonthEnd(0),
+                               freq='ME', tz='UTC').normalize()
+    idx = np.searchsorted(times, month_ends + pd.Timedelta(days=1), side='left') - 1
+    return pd.DataFrame({'date': month_ends, 'commit': commits[idx]})
+
+
+def token_history(repo_path, by='month', workers=None, batch_size=BATCH_SIZE,
+                  tokenizer_name=TOKENIZER, cache=None, max_bytes=MAX_FILE_BYTES):
+    """
+    Total tokens of each snapshot of the repository (see `snapshots`)
+
+    Each distinct blob is tokenized once however many snapshots contain it, so a
+    long history costs about one pass over the files that ever existed.
+
+    Returns:
+    --------
+    pandas.DataFrame
+        The snapshots with the number of text 'files' and their 'tokens'
+    """
+    start = time.perf_counter()
+    df = snapshots(repo_path, by)
+    trees = {}
+    for commit in df['commit'].unique():
+        trees[commit] = [sha for _, sha, _ in list_blobs(repo_path, commit, max_bytes, quiet=True)]
+    distinct = set().union(*trees.values())
+    print(f"{len(df)} snapshots, {sum(len(t) for t in trees.values())} files, {len(distinct)} distinct blobs")
+
+    counts = count_blobs(repo_path, distinct, workers, batch_size, tokenizer_name, cache)
+    df['files'] = [sum(1 for sha in trees[c] if counts[sha] is not None) for c in df['commit']]
+    df['tokens'] = [sum(counts[sha] or 0 for sha in trees[c]) for c in df['commit']]
+    print(f"Token history done in {time.perf_counter() - start:.1f}s")
+    return df
+
+
+def main(argv=None):
+    """
+    To run:
     python src/count_tokens.py <owner>/<repo> (from root folder)
     """
-    if len(sys.argv) < 2:
-        print("Please provide a GitHub repository name in format '<owner>/<repo>'.")
-    else:
-        repo_name = sys.argv[1]
-        owner, repo = repo_name.split('/', 1)
-        print(f"Owner: {owner} | Repo: {repo}")
-        repo_url = "https://github.com/" + repo_name + ".git"
-        repo_path = github_gather.clone_github_repo(repo_url)
-        total_tokens = tokenize_and_count(repo_path)
-        print(f"Total tokens in repository {repo_name}: {total_tokens}")
-        shutil.rmtree(repo_path) 
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Count the code tokens in a GitHub repository")
+    parser.add_argument('repo_name', help="repository as <owner>/<repo>")
+    parser.add_argument('--rev', default='HEAD', help="revision to count")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per core)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="files per batch")
+    parser.add_argument('--tokenizer', default=TOKENIZER, help="tokenizer name or local path")
+    parser.add_argument('--no-cache', action='store_true', help="tokenize every file again")
+    parser.add_argument('--max-bytes', type=int, default=MAX_FILE_BYTES,
+                        help="skip files larger than this")
+    parser.add_argument('--history', choices=['month', 'tag'],
+                        help="count every month (or tag) of the history and save the series")
+    args = parser.parse_args(argv)
+
+    repo_name = args.repo_name
+    owner, repo = repo_name.split('/', 1)
+    print(f"Owner: {owner} | Repo: {repo}")
+    repo_url = github_gather.GIT_BASE_URL + repo_name + ".git"
+    repo_path = clone_bare(repo_url)
+    cache = None if args.no_cache else TokenCache()
+    try:
+        if args.history:
+            df = token_history(repo_path, args.history, args.workers, args.batch_size,
+                               args.tokenizer, cache, args.max_bytes)
+            suffix = 'monthly' if args.history == 'month' else 'tags'
+            output_file = 'data/' + repo_name.replace('/', '-') + '-tokens-' + suffix + '.csv'
+            df.to_csv(output_file, index=False)
+            print(f"Saved token history to {output_file}")
+        else:
+            total_tokens = tokenize_and_count(repo_path, args.rev, args.workers, args.batch_size,
+                                              args.tokenizer, cache, args.max_bytes)
+            print(f"Total tokens in repository {repo_name}: {total_tokens}")
+    finally:
+        shutil.rmtree(repo_path)
+        if cache:
+            cache.close()
+
+
+# Main run
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,27 @@
 # Fitting the growth in developers to the Bass model
 
+import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime   
+import argparse
 import sys
-from sklearn.linear_model import LinearRegression
-from scipy.optimize import fsolve
+import time
+import telemetry
+import monthly_data
 pd.options.mode.chained_assignment = None  # default='warn'
 
+# scikit-learn, scipy and matplotlib take seconds to import, so they are
+# imported in the functions that use them
+
+# Folder the plots are saved in; the server's workers point it at a folder per job
+IMAGES_DIR = 'images'
+
+
+def image_path(repo_string, name):
+    """Path of the plot `name` of a repository, e.g. image_path('a-b', 'forecasts')"""
+    return os.path.join(IMAGES_DIR, f"{repo_string}_{name}.png")
+
 
 def bass(p, q, t):
     """
@@ -26,10 +39,12 @@ def bass(p, q, t):
     F = p*(np.exp((p+q)*t)-1)/(p*np.exp((p+q)*t)+q)
     return f, F
 
+@telemetry.counted
 def fitBass(df, repo_string, do_plot=True):
     """
     Fit the Bass model to the data
     """
+    from sklearn.linear_model import LinearRegression
     df["x"] = df["contributors"].cumsum()
     df["x2"] = df["x"]**2
     X = pd.concat([df["x"], df["x2"]], axis=1)
@@ -52,14 +67,17 @@ def fitBass(df, repo_string, do_plot=True):
 
     # Plot the fitted contributors per month
     if do_plot:
+        import matplotlib.pyplot as plt
         t = np.arange(0, len(df))
+        plt.figure()
         plt.plot(t, bass(p, q, t)[0]*m, color='red', linewidth=2)
         plt.scatter(t, df['contributors'])
         plt.title(f"Number of Developers per month [{repo_string}]")
         plt.xlabel("Months since project start")
         plt.grid(True)
-        plt.savefig(f"images/{repo_string}_fit_contributors.png")
+        plt.savefig(image_path(repo_string, 'fit_contributors'))
         plt.show()
+        plt.close()
 
     return p, q, m
 
@@ -74,6 +92,7 @@ def forecastL(p, q, m, t):
 
 
 # Function to solve for f=0 in bass(p,q,t)
+@telemetry.counted
 def solve_for_zero(t, p, q, m):
     """
     Solve for f=0 in bass(p, q, t)
@@ -85,9 +104,14 @@ def find_zero(t_initial_guess, p, q, m):
     """
     Find the value of t at which the function f value is zero
     """
-    t_zero = fsolve(solve_for_zero, t_initial_guess, args=(p, q, m))
+    from scipy.optimize import fsolve
+    t_zero, info, ier, mesg = fsolve(solve_for_zero, t_initial_guess, args=(p, q, m), full_output=True)
+    telemetry.event('find_zero', guess=t_initial_guess, t_zero=t_zero[0], nfev=info['nfev'],
+                    converged=ier == 1, message=mesg)
     if t_zero<0:
-        t_zero = fsolve(solve_for_zero, t_initial_guess*2, args=(p, q, m)) # in case guess too low initially
+        t_zero, info, ier, mesg = fsolve(solve_for_zero, t_initial_guess*2, args=(p, q, m), full_output=True) # in case guess too low initially
+        telemetry.event('find_zero', guess=t_initial_guess*2, t_zero=t_zero[0], nfev=info['nfev'],
+                        converged=ier == 1, message=mesg)
     return t_zero[0]
 
 
@@ -96,9 +120,9 @@ def get_project_developer_model_stats(repo_string):
     Get the project data
     """
     print("Project:", repo_string)
-    df = pd.read_csv("data/" + repo_string + "-monthly.csv")
-    start_date = df['date'].iloc[0].split()[0]
-    end_date = df['date'].iloc[-1].split()[0]
+    series = monthly_data.load_monthly(repo_string)
+    df = series.frame()
+    start_date, end_date = series.start_date, series.end_date
     # Fit the Bass model
     num_devs_df = df[['contributors']]
     p, q, m = fitBass(num_devs_df, repo_string)
@@ -111,31 +135,51 @@ def get_project_developer_model_stats(repo_string):
     print("Remaining months =", T-t, " =", yrs, "years")
     return start_date, end_date, p, q, m, t, T, yrs
 
-# Main run
-if __name__ == "__main__":
+MAX_FORECAST_MONTHS = 600
+
+def rounded(values, digits=3):
     """
-    To run: 
-    python src/fit_bass.py "<owner>/<repo>" (from root folder)
+    Round an array to a compact list for JSON output
+    """
+    return np.round(np.asarray(values, dtype=float), digits).tolist()
+
+
+def plotContributorsToEnd(p, q, m, t, T, repo_string):
+    """
+    Plot the fitted contributors per month through the end of growth T
     """
-    if len(sys.argv) < 2:
-        print("Please provide a GitHub repository name in format '<owner>/<repo>'.")
-        # EXAMPLES
-        # repo_name = 'jupyterlab/jupyter-ai'
-        # repo_name = 'jupyter-server/jupyter-scheduler'
-        # repo_name = 'pandas-dev/pandas'
-        # repo_name = 'jupyterlab/jupyterlab'
-        # repo_name = 'langchain-ai/langchain'
-        # repo_name = 'langchain-ai/langchain-aws'        
-    else:  
-        repo_name = sys.argv[1]
-        print("Repo name:", repo_name)
-        owner, repo = repo_name.split('/')
-        repo_string = owner + '-' + repo
-        df = pd.read_csv("data/" + repo_string + "-monthly.csv")
+    import matplotlib.pyplot as plt
+    plt.figure()
+    t_list = np.arange(0, t)
+    f, _ = bass(p, q, t_list)
+    plt.plot(t_list, f*m, linewidth=2)
+    plt.title(f"Number of Developers per month [{repo_string}]")
+    plt.xlabel("Months since project start")
+    plt.grid(True)
+    t_list = np.arange(t, T)
+    f, _ = bass(p, q, t_list)
+    plt.plot(t_list, f*m, linewidth=2, color='red')
+    plt.savefig(image_path(repo_string, 'contributors_to_end'))
+    plt.show()
+    plt.close()
+
+
+def run_bass(repo_name, do_plot=True):
+    """
+    Fit the Bass model for `<owner>/<repo>` from its monthly data file
+    and return the fitted parameters and the end of growth as a dict
+    """
+    print("Repo name:", repo_name)
+    owner, repo = repo_name.split('/')
+    repo_string = owner + '-' + repo
+    with telemetry.session('bass-' + repo_string):
+        series = monthly_data.load_monthly(repo_name)
+        df = series.frame()
 
         # Fit the Bass model
+        start = time.perf_counter()
         num_devs_df = df[['contributors']]
-        p, q, m = fitBass(num_devs_df, repo_string)
+        p, q, m = fitBass(num_devs_df, repo_string, do_plot=do_plot)
         print(f"p={p}, q={q}, m={m}")
 
         # Time to end of growth
@@ -143,16 +187,65 @@ if __name__ == "__main__":
         T = find_zero(t, p, q, m)
         print(f"Time of zero growth: {T} months")
         print("Remaining months =", T-t, " =", (T-t)/12, "years")
-        
-        # Plot the fitted contributors per month
-        t_list = np.arange(0, t)
-        f, _ = bass(p, q, t_list)
-        plt.plot(t_list, f*m, linewidth=2)
-        plt.title(f"Number of Developers per month [{repo_string}]")
-        plt.xlabel("Months since project start")
-        plt.grid(True)
-        t_list = np.arange(t, T)
-        f, _ = bass(p, q, t_list)
-        plt.plot(t_list, f*m, linewidth=2, color='red')
-        plt.savefig(f"images/{repo_string}_contributors_to_end.png")
-        plt.show()
\ No newline at end of file
+        print(f"Stage Bass fit finished in {time.perf_counter() - start:.1f}s", flush=True)
+
+        images = []
+        if do_plot:
+            plotContributorsToEnd(p, q, m, t, T, repo_string)
+            images = [
+                image_path(repo_string, 'fit_contributors'),
+                image_path(repo_string, 'contributors_to_end')
+            ]
+
+        # Fitted curve through the end of growth, capped for very long lifetimes
+        horizon = int(min(np.ceil(T), t + MAX_FORECAST_MONTHS)) if np.isfinite(T) else t
+        fitted = forecastL(p, q, m, np.arange(0, max(horizon, t)))
+
+        return {
+            'repo': repo_name,
+            'start_date': series.start_date,
+            'end_date': series.end_date,
+            'p': float(p),
+            'q': float(q),
+            'm': float(m),
+            't': int(t),
+            'T': float(T) if np.isfinite(T) else None,
+            'remaining_years': float((T-t)/12) if np.isfinite(T) else None,
+            'dates': series.dates.strftime('%Y-%m').tolist(),
+            'contributors': series.contributors.tolist(),
+            'fitted': rounded(fitted),
+            'images': images,
+        }
+
+
+def main(argv=None):
+    """
+    To run: 
+    python src/fit_bass.py "<owner>/<repo>" (from root folder)
+    """
+    # EXAMPLES
+    # repo_name = 'jupyterlab/jupyter-ai'
+    # repo_name = 'jupyter-server/jupyter-scheduler'
+    # repo_name = 'pandas-dev/pandas'
+    # repo_name = 'jupyterlab/jupyterlab'
+    # repo_name = 'langchain-ai/langchain'
+    # repo_name = 'langchain-ai/langchain-aws'
+    parser = argparse.ArgumentParser(description="Fit the Bass model of developer engagement to a repository's monthly data")
+    parser.add_argument('repo_name', help="GitHub repository in format <owner>/<repo>")
+    parser.add_argument('--no-plot', action='store_true', help="do not show or save the plots")
+    parser.add_argument('--telemetry', metavar='DIR',
+                        help="save call counts, timings and optimizer history of the fit in DIR")
+    parser.add_argument('--telemetry-profile', action='store_true',
+                        help="with --telemetry, also save a profile of the fit (slows it down)")
+    parser.add_argument('--telemetry-memory', action='store_true',
+                        help="with --telemetry, also trace the memory of the fit (slows it down)")
+    args = parser.parse_args(argv)
+    if args.telemetry:
+        telemetry.enable(args.telemetry, profile=args.telemetry_profile or None,
+                         memory=args.telemetry_memory or None)
+    run_bass(args.repo_name, do_plot=not args.no_plot)
+
+
+# Main run
+if __name__ == "__main__":
+    main()
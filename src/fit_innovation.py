@@ -1,14 +1,21 @@
+import argparse
 import sys
+import time
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from datetime import datetime
-from scipy.optimize import curve_fit, minimize
-from scipy.integrate import solve_ivp
-from fit_bass import bass, fitBass, forecastL
+from fit_bass import bass, fitBass, forecastL, image_path, rounded
+import telemetry
+import monthly_data
 
+# scipy and matplotlib are imported in the functions that use them, as in fit_bass
 
-def polyfit_innovation_timeseries(df, repo_string):
+# Number of optimizer iterations between progress messages in fitInnovation
+PROGRESS_EVERY = 100
+
+
+@telemetry.counted
+def polyfit_innovation_timeseries(df, repo_string, do_plot=True):
     """
     Fit the innovation model to the data using a second degree polynomial
     """
@@ -25,14 +32,6 @@ def polyfit_innovation_timeseries(df, repo_string):
     fitted_values = a * days_range**2 + b * days_range + c
     true_values = np.array(df['cumInnovation'])
 
-    # Plot original data and fitted curve
-    plt.figure(figsize=(6, 4))
-    plt.plot(df['date'], true_values, 'b.', alpha=0.5, label='Actual Data')
-    plt.plot(df['date'], fitted_values, 'r-', label='Quadratic Fit')
-    plt.title(f"Cumulative Innovation $A(t)$ with Quadratic Fit [{repo_string}]")
-    plt.grid(True)
-    plt.legend()
-
     # Print the equation of the fitted curve
     print(f"Quadratic equation: A(t) = {a:.2e}t² + {b:.2e}t + {c:.2e}")
 
@@ -43,8 +42,18 @@ def polyfit_innovation_timeseries(df, repo_string):
     r_squared = 1 - (ss_res / ss_tot)
     print(f"R² = {r_squared:.4f}")
 
-    plt.savefig(f"images/{repo_string}_polyfit_innovation.png")
-    plt.show()
+    # Plot original data and fitted curve
+    if do_plot:
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(6, 4))
+        plt.plot(df['date'], true_values, 'b.', alpha=0.5, label='Actual Data')
+        plt.plot(df['date'], fitted_values, 'r-', label='Quadratic Fit')
+        plt.title(f"Cumulative Innovation $A(t)$ with Quadratic Fit [{repo_string}]")
+        plt.grid(True)
+        plt.legend()
+        plt.savefig(image_path(repo_string, 'polyfit_innovation'))
+        plt.show()
+        plt.close()
     return fitted_values, true_values
 
      
@@ -52,10 +61,8 @@ def prepareDF(df):
     """
     Prepare the data frame for the innovation model
     """
-    # df.drop("Unnamed: 0", axis=1, inplace=True)
-    df = df[['date', 'total_changes', 'contributors']]
-    df.loc[:,'date'] = [j.split()[0] for j in df['date']]
-    df.loc[:,'date'] = [pd.to_datetime(j) for j in df['date']]
+    df = df[['date', 'total_changes', 'contributors']].copy()
+    df['date'] = monthly_data.parse_dates(df['date'])
     df['cumInnovation'] = df['total_changes'].cumsum()
     df = df[df['cumInnovation']>0].reset_index(drop=True)
     return df
@@ -65,6 +72,7 @@ def prepareDF(df):
 def dA_dt(A, L, gamma, lam, phi):
     return gamma * L**lam * A**phi
 
+@telemetry.counted
 def model(t, gamma, lam, phi, df_AL):
     A = np.zeros(len(t))
     L = np.zeros(len(t))
@@ -75,6 +83,7 @@ def model(t, gamma, lam, phi, df_AL):
         L[i] = df_AL['L'].iloc[i]
     return A
 
+@telemetry.counted
 def pct_least_squares(params, t, A_fitted_values, df_AL):
     gamma, lam, phi = params
     Ahat = model(t, gamma, lam, phi, df_AL)
@@ -82,7 +91,9 @@ def pct_least_squares(params, t, A_fitted_values, df_AL):
     return np.sqrt(np.mean(Adiff)) # RMSE
 
 
+@telemetry.counted
 def fitInnovation(df, repo_string, do_plot=True):
+    from scipy.optimize import minimize
     df_AL = pd.DataFrame({'A': list(df['cumInnovation']), 'L': list(df['contributors'])})
     df_AL = df_AL[df_AL.A>0]
     df_AL = df_AL[df_AL.L>0]
@@ -99,12 +110,26 @@ def fitInnovation(df, repo_string, do_plot=True):
     res = pct_least_squares(params, t, Atrue, df_AL)
     print("Initial obj fn value =", res)
 
-    # Minimize obj fn
+    # Minimize obj fn, reporting progress every PROGRESS_EVERY iterations
+    # (scipy passes the current point and its obj fn value to a callback
+    # whose argument is named intermediate_result)
+    iteration = 0
+    def report(intermediate_result):
+        nonlocal iteration
+        iteration += 1
+        telemetry.trace('fitInnovation', iteration=iteration, x=intermediate_result.x,
+                        fun=intermediate_result.fun)
+        if iteration % PROGRESS_EVERY == 0:
+            print(f"Iteration {iteration}: obj fn value = {intermediate_result.fun}", flush=True)
+
     sol = minimize(pct_least_squares, params, 
                 args=(t, Atrue, df_AL), 
-                method='Nelder-Mead', tol=1e-6, options={'maxiter':100000})
+                method='Nelder-Mead', tol=1e-6, options={'maxiter':100000},
+                callback=report)
     print("Final obj fn value =", sol.fun, "(", round(sol.fun/res*100,2), "% )")
     print("Solution success:", sol.success)
+    telemetry.event('fitInnovation', iterations=sol.nit, nfev=sol.nfev, success=sol.success,
+                    message=sol.message, initial_fun=res, fun=sol.fun, x=sol.x)
     [gamma, lam, phi] = sol.x
 
     # Fitted series
@@ -118,14 +143,17 @@ def fitInnovation(df, repo_string, do_plot=True):
 
     # First subplot
     if do_plot:
+        import matplotlib.pyplot as plt
+        plt.figure()
         plt.plot(t, Ahat, label="Ahat")
         plt.plot(t, Atrue, label="Atrue")
         plt.title(f"A: Innovation [{repo_string}]")
         plt.xlabel('Time periods')
         plt.legend()
         plt.grid()
-        plt.savefig(f"images/{repo_string}_innovation_fit.png")
+        plt.savefig(image_path(repo_string, 'innovation_fit'))
         plt.show()
+        plt.close()
 
     return gamma, lam, phi
 
@@ -152,6 +180,7 @@ def plotForecast(A, L, forecast_length, repo_string):
     Plot the forecasted innovation and the number of developers
     `forecast_length` is the number of months to forecast
     """
+    import matplotlib.pyplot as plt
     t = np.arange(len(A))
     # Create plots
     plt.figure(figsize=(15, 5))
@@ -188,49 +217,105 @@ def plotForecast(A, L, forecast_length, repo_string):
     plt.legend()
 
     plt.tight_layout()
-    plt.savefig(f"images/{repo_string}_forecasts.png")
+    plt.savefig(image_path(repo_string, 'forecasts'))
     plt.show()
+    plt.close()
 
 
 
-# Main run
-if __name__ == "__main__":
+def run_innovation(repo_name, forecast_length=12, do_plot=True, bass_fit=None):
     """
-    To run: 
-    python src/fit_innovation.py "<owner>/<repo>" (from root folder)
+    Fit the Bass and innovation models for `<owner>/<repo>` from its monthly
+    data file and return the fitted parameters and forecasts as a dict
+    `forecast_length` is the number of months to forecast
+    `bass_fit` is an earlier Bass fit of the same data (a dict with p, q and m,
+    as returned by `run_bass`) to use instead of fitting it again
     """
-    if len(sys.argv) < 2:
-        print("Please provide a GitHub repository name in format '<owner>/<repo>'.")
-        # EXAMPLES
-        # repo_name = 'jupyterlab/jupyter-ai'
-        # repo_name = 'jupyter-server/jupyter-scheduler'
-        # repo_name = 'pandas-dev/pandas'
-        # repo_name = 'jupyterlab/jupyterlab'
-        # repo_name = 'langchain-ai/langchain'
-        # repo_name = 'langchain-ai/langchain-aws'        
-    else:  
-        repo_name = sys.argv[1]
-        owner, repo = repo_name.split('/')
-        repo_string = owner + '-' + repo
-        df = pd.read_csv("data/" + repo_string + "-monthly.csv")
+    owner, repo = repo_name.split('/')
+    repo_string = owner + '-' + repo
+    with telemetry.session('innovation-' + repo_string):
+        df = monthly_data.load_monthly(repo_name).frame()
 
         # Fit contributor data
+        start = time.perf_counter()
         num_devs_df = df[['contributors']]
-        p, q, m = fitBass(num_devs_df, repo_string)
+        if bass_fit is None:
+            p, q, m = fitBass(num_devs_df, repo_string, do_plot=do_plot)
+        else:
+            p, q, m = bass_fit['p'], bass_fit['q'], bass_fit['m']
         t = np.arange(0, len(num_devs_df))
         fitted_contributors = bass(p, q, t)[0]*m
         df.loc[:,'contributors'] = fitted_contributors.astype(np.int64) # replace contributors with fitted values
+        print(f"Stage Bass fit finished in {time.perf_counter() - start:.1f}s", flush=True)
 
         # Fit innovation data
+        start = time.perf_counter()
         df = prepareDF(df)
-        fitted_values, true_values = polyfit_innovation_timeseries(df, repo_string)
-        gamma, lam, phi = fitInnovation(df, repo_string)
-        
+        fitted_values, true_values = polyfit_innovation_timeseries(df, repo_string, do_plot=do_plot)
+        gamma, lam, phi = fitInnovation(df, repo_string, do_plot=do_plot)
+        print(f"Stage innovation fit finished in {time.perf_counter() - start:.1f}s", flush=True)
+    
         # get forecasts
-        forecast_length = 12 # for no forecast, set to 1 month
-        t = np.arange(len(df)+forecast_length) # added 120 months to forecast, i.e., 10 years
+        t = np.arange(len(df)+forecast_length)
         L = forecastL(p, q, m, t)
-        # A = forecastA(gamma, lam, phi, t, df['cumInnovation'][0], L)
         A = forecastA(gamma, lam, phi, t, df['cumInnovation'][0], df['contributors'], L)
-        plotForecast(A, L, forecast_length, repo_string)
-        
\ No newline at end of file
+
+        images = []
+        if do_plot:
+            plotForecast(A, L, forecast_length, repo_string)
+            images = [
+                image_path(repo_string, 'innovation_fit'),
+                image_path(repo_string, 'polyfit_innovation'),
+                image_path(repo_string, 'forecasts')
+            ]
+
+        return {
+            'repo': repo_name,
+            'p': float(p),
+            'q': float(q),
+            'm': float(m),
+            'gamma': float(gamma),
+            'lambda': float(lam),
+            'phi': float(phi),
+            'forecast_length': int(forecast_length),
+            'dates': [d.strftime('%Y-%m') for d in df['date']],
+            'cumInnovation': df['cumInnovation'].astype(float).tolist(),
+            'A': rounded(A),
+            'L': rounded(L),
+            'images': images,
+        }
+
+
+def main(argv=None):
+    """
+    To run: 
+    python src/fit_innovation.py "<owner>/<repo>" (from root folder)
+    """
+    # EXAMPLES
+    # repo_name = 'jupyterlab/jupyter-ai'
+    # repo_name = 'jupyter-server/jupyter-scheduler'
+    # repo_name = 'pandas-dev/pandas'
+    # repo_name = 'jupyterlab/jupyterlab'
+    # repo_name = 'langchain-ai/langchain'
+    # repo_name = 'langchain-ai/langchain-aws'
+    parser = argparse.ArgumentParser(description="Fit and forecast the innovation model for a repository")
+    parser.add_argument('repo_name', help="GitHub repository in format <owner>/<repo>")
+    parser.add_argument('--forecast-length', type=int, default=12,
+                        help="months to forecast (for no forecast, 1)")
+    parser.add_argument('--no-plot', action='store_true', help="do not show or save the plots")
+    parser.add_argument('--telemetry', metavar='DIR',
+                        help="save call counts, timings and optimizer history of the fit in DIR")
+    parser.add_argument('--telemetry-profile', action='store_true',
+                        help="with --telemetry, also save a profile of the fit (slows it down)")
+    parser.add_argument('--telemetry-memory', action='store_true',
+                        help="with --telemetry, also trace the memory of the fit (slows it down)")
+    args = parser.parse_args(argv)
+    if args.telemetry:
+        telemetry.enable(args.telemetry, profile=args.telemetry_profile or None,
+                         memory=args.telemetry_memory or None)
+    run_innovation(args.repo_name, forecast_length=args.forecast_length, do_plot=not args.no_plot)
+
+
+# Main run
+if __name__ == "__main__":
+    main()
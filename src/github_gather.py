@@ -3,14 +3,18 @@ Collects commit information from a specified GitHub repository and processes it
 Functions:
     install_gitpython():
         Installs GitPython if it is not already installed.
+    gitpython():
+        Returns the GitPython module, installing it on first use.
     clone_github_repo(repo_url, local_path=None):
         Clones a GitHub repository to a local directory.
     collect_commits(repo_path):
         Collects commit information from a local git repository and returns it as a pandas DataFrame.
-    get_commits_df(repo_url):
+    get_commits_df(repo_url, repo_name=None, local_path=None):
         Main function to clone a repository and collect commits, saving the data to CSV files.
-    get_monthly_commits(df):
+    get_monthly_commits(df, repo_name):
         Consolidates the commits data by month to give a time series for modeling, saving the data to a CSV file.
+    gather_repo(repo_name):
+        Runs the full gather for '<owner>/<repo>' and removes the clone afterwards.
 Usage:
     To run the script, use the following command:
     python github_gather.py "<owner>/<repo>"
@@ -20,8 +24,12 @@ import os
 import pandas as pd
 from datetime import datetime
 import subprocess
+import argparse
 import sys
 import shutil
+import tempfile
+import time
+import commit_store
 
 def install_gitpython():
     """Install GitPython if not already installed"""
@@ -35,8 +43,25 @@ def install_gitpython():
         import git
         return git
 
-# Install GitPython
-git = install_gitpython()
+# GitPython is imported (and installed if missing) on first use rather than at
+# import time, see gitpython()
+_git = None
+
+
+def gitpython():
+    """The GitPython module, installing it on first use if needed"""
+    global _git
+    if _git is None:
+        _git = install_gitpython()
+    return _git
+
+
+# Number of commits between progress messages in collect_commits
+PROGRESS_EVERY = 100
+
+# Where '<owner>/<repo>.git' is cloned from; point it at a local folder of
+# repositories (e.g. file:///tmp/repos/) to gather without GitHub
+GIT_BASE_URL = os.environ.get('OSS_LIFECYCLE_GIT_URL', 'https://github.com/')
 
 # Functions to collect GitHub commits
 def clone_github_repo(repo_url, local_path=None):
@@ -66,7 +91,7 @@ def clone_github_repo(repo_url, local_path=None):
         print(f"Directory {local_path} already exists. Skipping clone.")
     else:
         # Clone the repository
-        git.Repo.clone_from(repo_url, local_path)
+        gitpython().Repo.clone_from(repo_url, local_path)
         print(f"Repository cloned to {local_path}")
     
     return local_path
@@ -86,11 +111,11 @@ def collect_commits(repo_path):
         DataFrame with commit details
     """
     # Open the repository
-    repo = git.Repo(repo_path)
+    repo = gitpython().Repo(repo_path)
     
     # Collect commit information
     commits_data = []
-    for commit in repo.iter_commits():
+    for n, commit in enumerate(repo.iter_commits(), start=1):
         commit_info = {
             'hash': commit.hexsha,
             'author': commit.author.name,
@@ -102,14 +127,15 @@ def collect_commits(repo_path):
             'files_changed': commit.stats.total['files']
         }
         commits_data.append(commit_info)
-        print(commit.authored_datetime, end='..')
+        if n % PROGRESS_EVERY == 0:
+            print(f"Processed {n} commits (at {commit.authored_datetime})", flush=True)
     
     # Convert to DataFrame
     df_commits = pd.DataFrame(commits_data)
     
     return df_commits
 
-def get_commits_df(repo_url):
+def get_commits_df(repo_url, repo_name=None, local_path=None):
     """
     Main function to clone repo and collect commits
     
@@ -117,14 +143,25 @@ def get_commits_df(repo_url):
     -----------
     repo_url : str
         URL of the GitHub repository
+    repo_name : str, optional
+        Repository name in format '<owner>/<repo>'. 
+        If None, it is taken from the last two parts of `repo_url`
+    local_path : str, optional
+        Local path to clone the repository, as in `clone_github_repo`
     """
+    if repo_name is None:
+        repo_name = '/'.join(repo_url.replace('.git', '').split('/')[-2:])
+
     # Clone the repository
-    repo_path = clone_github_repo(repo_url)
+    repo_path = clone_github_repo(repo_url, local_path)
     package = repo_name.replace('/', '-')
     
     # Collect commits
     df_commits = collect_commits(repo_path)
-    df_commits.to_csv('data/' + package + '-commits_w_desc.csv', index=False)
+    commits_file = 'data/' + package + '-commits_w_desc.csv'
+    df_commits.to_csv(commits_file, index=False)
+    # Month-partitioned copy for activity reports
+    commit_store.write_commit_store(df_commits, commits_file)
 
     # Reformat df to clean up 
     df = df_commits[['hash','author','date','additions','deletions']]
@@ -139,7 +176,7 @@ def get_commits_df(repo_url):
     return df
 
 # Create monthly data frame
-def get_monthly_commits(df):
+def get_monthly_commits(df, repo_name):
     """
     Consolidates the commits data by month to give a time series for modeling
     """
@@ -163,26 +200,65 @@ def get_monthly_commits(df):
 
     return df1
 
-# Main run
-if __name__ == "__main__":
+def gather_repo(repo_name):
+    """
+    Clone '<owner>/<repo>', save its commits and monthly data, and remove the clone
+    
+    Returns:
+    --------
+    dict
+        Number of commits and months gathered, and the data files written
+    """
+    owner, repo = repo_name.split('/', 1)
+    print(f"Owner: {owner} | Repo: {repo}")
+    repo_url = GIT_BASE_URL + repo_name + ".git"
+    package = repo_name.replace('/', '-')
+    # A clone folder of its own, so that gathers of repos with the same name,
+    # or of the same repo, running at once never share or remove each other's clone
+    tmp = tempfile.mkdtemp(prefix=package + '-', dir='.')
+    try:
+        start = time.perf_counter()
+        repo_path = clone_github_repo(repo_url, os.path.join(tmp, 'repo'))
+        print(f"Stage clone finished in {time.perf_counter() - start:.1f}s", flush=True)
+        start = time.perf_counter()
+        df = get_commits_df(repo_url, repo_name, repo_path)
+        print(f"Stage commits finished in {time.perf_counter() - start:.1f}s", flush=True)
+        start = time.perf_counter()
+        df1 = get_monthly_commits(df, repo_name)
+        print(f"Stage monthly finished in {time.perf_counter() - start:.1f}s", flush=True)
+    finally:
+        shutil.rmtree(tmp)
+
+    return {
+        'repo': repo_name,
+        'commits': len(df),
+        'months': len(df1),
+        'files': [
+            'data/' + package + '-commits_w_desc.csv',
+            'data/' + package + '-commits.csv',
+            'data/' + package + '-monthly.csv',
+        ],
+    }
+
+
+def main(argv=None):
     """
     To run: 
     python src/github_gather.py <owner>/<repo> (from root folder)
     """
-    if len(sys.argv) < 2:
-        print("Please provide a GitHub repository name in format '<owner>/<repo>'.")
-        # EXAMPLES
-        # repo_name = 'jupyterlab/jupyter-ai'
-        # repo_name = 'jupyter-server/jupyter-scheduler'
-        # repo_name = 'pandas-dev/pandas'
-        # repo_name = 'jupyterlab/jupyterlab'
-        # repo_name = 'langchain-ai/langchain'
-        # repo_name = 'langchain-ai/langchain-aws'        
-    else:  
-        repo_name = sys.argv[1]
-        owner, repo = repo_name.split('/', 1)
-        print(f"Owner: {owner} | Repo: {repo}")
-        repo_url = "https://github.com/" + repo_name + ".git"
-        df = get_commits_df(repo_url)
-        df1 = get_monthly_commits(df)
-        shutil.rmtree(repo)
+    # EXAMPLES
+    # repo_name = 'jupyterlab/jupyter-ai'
+    # repo_name = 'jupyter-server/jupyter-scheduler'
+    # repo_name = 'pandas-dev/pandas'
+    # repo_name = 'jupyterlab/jupyterlab'
+    # repo_name = 'langchain-ai/langchain'
+    # repo_name = 'langchain-ai/langchain-aws'
+    parser = argparse.ArgumentParser(description="Clone a GitHub repository and save its commit and monthly data")
+    parser.add_argument('repo_name', help="GitHub repository in format <owner>/<repo>")
+    args = parser.parse_args(argv)
+    gather_repo(args.repo_name)
+
+
+# Main run
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Asynchronous jobs for the server. Gathers and model fits are submitted to the
+worker pool in `model_pool` and tracked by a job id, so requests return
+immediately and clients poll for the result.
+Requests for the same kind of job on the same repo share one job: while it is
+queued or running, later submissions attach to it instead of starting a
+second clone into the same directory. Finished gathers are kept and returned
+again until a refresh is asked for.
+Functions:
+    submit(kind, repo_name, refresh=False, **options):
+        Returns the job for `kind` ('gather', 'bass' or 'innovation') on
+        '<owner>/<repo>' with these model options, starting one if none can
+        be reused.
+    get(job_id):
+        Returns the job with this id, or None.
+    set_result_handler(handler):
+        Calls `handler(job, result)` once when a job finishes, before anyone
+        waiting on it is released, and keeps what it returns as the result.
+Each job keeps the last LOG_LINES lines its task printed; `Job.follow()`
+yields them as they arrive, for streaming progress to clients. A job is only
+done once its result and all of its lines have arrived.
+"""
+
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+import model_pool
+
+TASKS = {
+    'gather': model_pool.gather_task,
+    'bass': model_pool.bass_task,
+    'innovation': model_pool.innovation_task,
+}
+
+# Kinds whose finished results are reused by later submissions
+REUSABLE = {'gather'}
+
+# Finished jobs kept for lookup by id before the oldest are dropped
+MAX_FINISHED = 256
+
+# Progress lines kept per job; slow listeners skip lines older than this
+LOG_LINES = 500
+
+
+class Job:
+    def __init__(self, kind, repo_name, options):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.repo_name = repo_name
+        self.options = options
+        self.submitted = time.time()
+        self.finished = None
+        self.future = None
+        self.result = None
+        self.done = threading.Event()
+        self.log = deque(maxlen=LOG_LINES)
+        self.log_count = 0
+        self.changed = threading.Condition()
+        # Parts still to arrive before the job is done
+        self.pending = {'result', 'log'}
+
+    @property
+    def status(self):
+        if self.done.is_set():
+            return 'done' if self.result['success'] else 'failed'
+        if self.future is not None and self.future.running():
+            return 'running'
+        return 'queued'
+
+    def add_progress(self, line):
+        with self.changed:
+            self.log.append(line)
+            self.log_count += 1
+            self.changed.notify_all()
+
+    def follow(self, heartbeat=15):
+        """
+        Yield progress lines as they are printed, then stop once the job is
+        done. Yields None when nothing happened for `heartbeat` seconds
+        """
+        seen = 0
+        while True:
+            with self.changed:
+                if self.log_count == seen and not self.done.is_set():
+                    self.changed.wait(heartbeat)
+                # Lines that fell out of the log are skipped
+                seen = max(seen, self.log_count - len(self.log))
+                new_lines = list(self.log)[len(self.log) - (self.log_count - seen):]
+                seen = self.log_count
+                finished = self.done.is_set()
+            if new_lines:
+                yield from new_lines
+            elif not finished:
+                yield None
+            if finished:
+                return
+
+    def wait(self, timeout=None):
+        """Block until the job finishes and return its result dict"""
+        self.done.wait(timeout)
+        return self.result
+
+    def to_dict(self, include_result=True):
+        end = self.finished or time.time()
+        d = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'repo': self.repo_name,
+            'status': self.status,
+            'elapsed': round(end - self.submitted, 1),
+        }
+        if self.log:
+            d['progress'] = self.log[-1]
+        if include_result and self.done.is_set():
+            d.update(self.result)
+        return d
+
+
+_lock = threading.Lock()
+_jobs = OrderedDict()
+_by_key = {}
+_result_handler = None
+
+
+def submit(kind, repo_name, refresh=False, **options):
+    """Return the in-flight or reusable job for (kind, repo_name, options), or start a new one"""
+    if kind not in TASKS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    key = _job_key(kind, repo_name, options)
+    with _lock:
+        job = _by_key.get(key)
+        if job is not None and not job.done.is_set():
+            return job
+        if job is not None and kind in REUSABLE and job.status == 'done' and not refresh:
+            return job
+        job = Job(kind, repo_name, options)
+        _jobs[job.id] = job
+        _by_key[key] = job
+        _evict_finished()
+    try:
+        job.future = model_pool.submit(TASKS[kind], repo_name, job_id=job.id, **options)
+    except Exception as e:
+        # E.g. a broken or shut down pool: fail this job so that waiters are
+        # released and the next submission starts a new one
+        with _lock:
+            if _by_key.get(key) is job:
+                del _by_key[key]
+            _jobs.pop(job.id, None)
+        job.result = {'success': False, 'output': '', 'error': str(e)}
+        _complete(job, 'result', 'log')
+        raise
+    job.future.add_done_callback(lambda future: _finish(job, future))
+    return job
+
+
+def get(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def _job_key(kind, repo_name, options):
+    return (kind, repo_name, tuple(sorted(options.items())))
+
+
+def set_result_handler(handler):
+    global _result_handler
+    _result_handler = handler
+
+
+def _finish(job, future):
+    parts = ['result']
+    try:
+        job.result = future.result()
+    except Exception as e:
+        # The pool itself failed, e.g. a worker died: no end of log will come
+        job.result = {'success': False, 'output': '', 'error': str(e)}
+        parts.append('log')
+    if _result_handler is not None:
+        try:
+            job.result = _result_handler(job, job.result)
+        except Exception as e:
+            job.result = {**job.result, 'success': False, 'error': f"{type(e).__name__}: {e}"}
+    _complete(job, *parts)
+
+
+def _complete(job, *parts):
+    """Mark parts of a job as arrived, and the job done once nothing is pending"""
+    with job.changed:
+        job.pending.difference_update(parts)
+        if job.pending or job.done.is_set():
+            return
+        job.finished = time.time()
+        job.done.set()
+        job.changed.notify_all()
+
+
+def _on_progress(job_id, line):
+    job = get(job_id)
+    if job is None:
+        return
+    if line is None:
+        # The task's last line has been forwarded
+        _complete(job, 'log')
+    else:
+        job.add_progress(line)
+
+
+model_pool.set_progress_handler(_on_progress)
+
+
+def _evict_finished():
+    """Drop the oldest finished jobs beyond MAX_FINISHED (caller holds the lock)"""
+    finished = [j for j in _jobs.values() if j.done.is_set()]
+    for job in itertools.islice(finished, max(0, len(finished) - MAX_FINISHED)):
+        del _jobs[job.id]
+        key = _job_key(job.kind, job.repo_name, job.options)
+        if _by_key.get(key) is job:
+            del _by_key[key]
@@ -0,0 +1,243 @@
+"""
+Warm pool of worker processes that run the lifecycle models for the server.
+Each worker imports `fit_bass`, `fit_innovation` and `github_gather` once at
+startup, so requests call the model functions directly instead of starting a
+new Python interpreter and re-importing pandas, scikit-learn, scipy and
+matplotlib every time.
+Functions:
+    start(workers=None, gather_workers=None):
+        Starts the pool with `workers` processes and warms every worker up.
+        The gather pool, of `gather_workers` processes, starts on the first gather.
+    submit(task, *args, **kwargs):
+        Runs one of the task functions below in the pool and returns a future.
+        Gathers run in a pool of their own, so long clones never hold up
+        the model fits.
+    shutdown():
+        Stops the pools.
+    set_progress_handler(handler):
+        Calls `handler(job_id, line)` in the server for each line a task prints,
+        then `handler(job_id, None)` once the task's last line has been passed on.
+    bass_task(repo_name, job_id=None, **options),
+    innovation_task(repo_name, job_id=None, **options),
+    gather_task(repo_name, job_id=None):
+        Run the models or the gather in a worker and return a dict with
+        `success`, the tail of the printed `output` and the structured
+        `result`. Printed lines are forwarded to the progress handler as they
+        happen when a `job_id` is given. Model plots are saved in
+        JOB_IMAGES_DIR/<job_id>/, and model results carry the `data_digest`
+        of the monthly data they were fitted to.
+Usage:
+    The pool size defaults to the OSS_LIFECYCLE_WORKERS environment variable
+    (2 if unset) and can be set with `python src/server.py --workers <n>`.
+    Gathers run at most OSS_LIFECYCLE_GATHER_WORKERS at once (1 if unset), set
+    with `--gather-workers <n>`; more gathers wait for their turn.
+"""
+
+import contextlib
+import io
+import multiprocessing
+import os
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_WORKERS = int(os.environ.get('OSS_LIFECYCLE_WORKERS', 2))
+DEFAULT_GATHER_WORKERS = int(os.environ.get('OSS_LIFECYCLE_GATHER_WORKERS', 1))
+
+# Printed lines kept in a task's `output`; earlier lines are only streamed
+OUTPUT_TAIL_LINES = 200
+
+# Plots of each model job are saved in <JOB_IMAGES_DIR>/<job id>/
+JOB_IMAGES_DIR = os.path.join('cache', 'jobs')
+
+_pool = None
+_workers = DEFAULT_WORKERS
+_gather_pool = None
+_gather_workers = DEFAULT_GATHER_WORKERS
+_progress_queue = None
+_progress_handler = None
+_start_lock = threading.Lock()
+
+
+def _init_gather_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+    import github_gather
+    github_gather.gitpython()
+
+
+def _init_worker(progress_queue):
+    """Import the model modules once per worker, rendering plots off-screen"""
+    global _progress_queue
+    _progress_queue = progress_queue
+    import matplotlib
+    matplotlib.use('Agg')
+    import fit_bass
+    import fit_innovation
+    import github_gather
+    # The models import these lazily; a warm worker has them loaded already
+    import matplotlib.pyplot
+    import scipy.optimize
+    import sklearn.linear_model
+    github_gather.gitpython()
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def start(workers=None, gather_workers=None):
+    """Start the pool and make sure every worker has imported the models"""
+    global _pool, _workers, _gather_workers, _progress_queue
+    with _start_lock:
+        if workers is not None:
+            _workers = workers
+        if gather_workers is not None:
+            _gather_workers = gather_workers
+        if _pool is not None:
+            return _pool
+        _progress_queue = multiprocessing.Queue()
+        threading.Thread(target=_forward_progress, args=(_progress_queue,), daemon=True).start()
+        _pool = ProcessPoolExecutor(max_workers=_workers, initializer=_init_worker,
+                                    initargs=(_progress_queue,))
+        # Processes are spawned on demand, so submit one no-op per worker
+        for future in [_pool.submit(_warm_up) for _ in range(_workers)]:
+            future.result()
+        return _pool
+
+
+def _start_gather_pool():
+    """The pool for gathers, started on the first gather"""
+    global _gather_pool
+    start()
+    with _start_lock:
+        if _gather_pool is None:
+            _gather_pool = ProcessPoolExecutor(max_workers=_gather_workers,
+                                               initializer=_init_gather_worker,
+                                               initargs=(_progress_queue,))
+        return _gather_pool
+
+
+def submit(task, *args, **kwargs):
+    """Run `task` in its pool, starting the pool on first use"""
+    pool = _start_gather_pool() if task is gather_task else start()
+    return pool.submit(task, *args, **kwargs)
+
+
+def shutdown():
+    global _pool, _gather_pool, _progress_queue
+    with _start_lock:
+        if _gather_pool is not None:
+            _gather_pool.shutdown(cancel_futures=True)
+            _gather_pool = None
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _progress_queue.put(None)
+            _pool = None
+            _progress_queue = None
+
+
+def set_progress_handler(handler):
+    global _progress_handler
+    _progress_handler = handler
+
+
+def _forward_progress(progress_queue):
+    """Pass lines printed in the workers on to the progress handler"""
+    while (item := progress_queue.get()) is not None:
+        if _progress_handler is not None:
+            _progress_handler(*item)
+
+
+class _ProgressWriter(io.TextIOBase):
+    """
+    Stand-in for stdout in a task. Sends each complete line to the server as
+    progress and keeps only the last OUTPUT_TAIL_LINES for the result
+    """
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.tail = deque(maxlen=OUTPUT_TAIL_LINES)
+        self.partial = ''
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        *lines, self.partial = (self.partial + text).split('\n')
+        for line in lines:
+            self._emit(line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def close_line(self):
+        if self.partial:
+            self._emit(self.partial)
+            self.partial = ''
+
+    def _emit(self, line):
+        self.tail.append(line)
+        if self.job_id is not None and _progress_queue is not None:
+            _progress_queue.put((self.job_id, line))
+
+    def getvalue(self):
+        return '\n'.join(self.tail)
+
+
+def _run_captured(func, *args, job_id=None, **kwargs):
+    """Call `func`, streaming what it prints, and report errors instead of raising"""
+    writer = _ProgressWriter(job_id)
+    try:
+        with contextlib.redirect_stdout(writer):
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                writer.close_line()
+                return {'success': False, 'output': writer.getvalue(), 'error': traceback.format_exc()}
+        writer.close_line()
+        return {'success': True, 'output': writer.getvalue(), 'result': result}
+    finally:
+        # Queued after the task's lines, so it is forwarded after all of them
+        if job_id is not None and _progress_queue is not None:
+            _progress_queue.put((job_id, None))
+
+
+def _run_model(func, repo_name, job_id=None, **options):
+    """
+    Run a model with its plots saved in a folder of the job's own, so fits
+    running at once never overwrite each other's images. The result carries
+    the `data_digest` of the monthly data fitted, or None if the data changed
+    during the fit
+    """
+    import fit_bass
+    import monthly_data
+    import result_cache
+    data_file = monthly_data.monthly_path(repo_name)
+    before = result_cache.file_digest(data_file) if os.path.exists(data_file) else None
+    if job_id is not None:
+        fit_bass.IMAGES_DIR = os.path.join(JOB_IMAGES_DIR, job_id)
+        os.makedirs(fit_bass.IMAGES_DIR, exist_ok=True)
+    try:
+        result = _run_captured(func, repo_name, job_id=job_id, **options)
+    finally:
+        fit_bass.IMAGES_DIR = 'images'
+    after = result_cache.file_digest(data_file) if os.path.exists(data_file) else None
+    result['data_digest'] = before if before == after else None
+    return result
+
+
+def bass_task(repo_name, job_id=None, **options):
+    import fit_bass
+    return _run_model(fit_bass.run_bass, repo_name, job_id=job_id, **options)
+
+
+def innovation_task(repo_name, job_id=None, **options):
+    import fit_innovation
+    return _run_model(fit_innovation.run_innovation, repo_name, job_id=job_id, **options)
+
+
+def gather_task(repo_name, job_id=None):
+    import github_gather
+    return _run_captured(github_gather.gather_repo, repo_name, job_id=job_id)
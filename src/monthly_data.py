@@ -0,0 +1,92 @@
+"""
+Shared loader of the monthly series in `data/<owner>-<repo>-monthly.csv`.
+The file is parsed once per process: the dates in one vectorized pass, the
+contributors and total changes into contiguous int64 arrays. The parsed series
+is kept until the file's size or modification time change, so long-lived
+processes (the server's model workers, the pipeline, the portfolio) refit a
+repository without reading its data again. The arrays are read-only, and
+`frame()` gives every caller its own DataFrame to modify.
+Classes:
+    MonthlySeries:
+        `dates` (month ends, as datetime64), `contributors` and `total_changes`
+        (int64 arrays), `start_date` and `end_date` ('YYYY-MM-DD'), `frame()`.
+Functions:
+    monthly_path(repo_name):
+        Path of the monthly data file of '<owner>/<repo>'.
+    parse_dates(values):
+        Month-end dates of the 'date' column, in one vectorized pass.
+    load_monthly(repo_name):
+        The parsed series of '<owner>/<repo>', memoized per file.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+_series = {}
+_lock = threading.Lock()
+
+
+def monthly_path(repo_name):
+    return 'data/' + repo_name.replace('/', '-') + '-monthly.csv'
+
+
+def parse_dates(values):
+    """
+    Dates of a 'date' column as written by `github_gather.get_monthly_commits`
+    ('2015-07-31 00:00:00+00:00'), as dates without time or time zone
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values.str.slice(0, 10), format='%Y-%m-%d')
+
+
+def _readonly(values):
+    values = np.ascontiguousarray(values, dtype=np.int64)
+    values.flags.writeable = False
+    return values
+
+
+class MonthlySeries:
+    def __init__(self, path):
+        df = pd.read_csv(path, usecols=['date', 'contributors', 'total_changes'])
+        self.path = path
+        self.dates = pd.DatetimeIndex(parse_dates(df['date']))
+        self.contributors = _readonly(df['contributors'])
+        self.total_changes = _readonly(df['total_changes'])
+        self.start_date = self.dates[0].strftime('%Y-%m-%d')
+        self.end_date = self.dates[-1].strftime('%Y-%m-%d')
+
+    def __len__(self):
+        return len(self.dates)
+
+    def frame(self):
+        """A new DataFrame with 'date', 'contributors' and 'total_changes'"""
+        return pd.DataFrame({
+            'date': self.dates,
+            'contributors': self.contributors.copy(),
+            'total_changes': self.total_changes.copy(),
+        })
+
+
+def load_monthly(repo_name):
+    """
+    The monthly series of '<owner>/<repo>', parsed again only when its file changes
+
+    Returns:
+    --------
+    MonthlySeries
+    """
+    path = monthly_path(repo_name)
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        cached = _series.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    series = MonthlySeries(path)
+    with _lock:
+        _series[path] = (stamp, series)
+    return series
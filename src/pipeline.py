@@ -0,0 +1,266 @@
+"""
+Runs the modeling pipeline for one or more repositories as a graph of stages:
+    gather -> monthly -> bass -> innovation
+Each stage records in `cache/pipeline/<owner>-<repo>/manifest.json` a hash of
+its inputs and the SHA-256 of the files it wrote. A stage whose inputs hash the
+same and whose outputs are unchanged on disk is skipped, so a rerun only does
+the work downstream of what changed:
+    gather      input: the commit at the remote's HEAD (`git ls-remote`)
+                outputs: data/<owner>-<repo>-commits.csv and -commits_w_desc.csv
+    monthly     input: the commits file; output: data/<owner>-<repo>-monthly.csv
+    bass        input: the monthly file; output: bass.json (the `run_bass` result)
+    innovation  inputs: the monthly file and bass.json, whose fit it reuses
+                output: innovation.json (the `run_innovation` result)
+Repositories are independent and run in parallel worker processes.
+Functions:
+    remote_head(repo_name):
+        Commit at HEAD of the repository's remote, or None if it cannot be reached.
+    run_repo(repo_name, forecast_length=12, do_plot=False, force=False, offline=False):
+        Runs the stages of one repository that are out of date.
+    run_pipeline(repo_names, workers=None, **options):
+        Runs `run_repo` for several repositories in parallel.
+Usage:
+    python src/pipeline.py <owner>/<repo> [<owner>/<repo> ...] [--workers N]
+        [--forecast-length 12] [--plot] [--force] [--offline]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import result_cache
+
+PIPELINE_DIR = os.path.join('cache', 'pipeline')
+STAGES = ['gather', 'monthly', 'bass', 'innovation']
+
+
+def _hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def remote_head(repo_name):
+    """Return the commit at HEAD of `repo_name`'s remote, or None if it cannot be reached"""
+    import github_gather
+    repo_url = github_gather.GIT_BASE_URL + repo_name + ".git"
+    try:
+        out = subprocess.run(['git', 'ls-remote', repo_url, 'HEAD'], capture_output=True,
+                             text=True, timeout=60, check=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.split()[0] if out else None
+
+
+class Manifest:
+    """The stages recorded for one repository, saved after each stage"""
+
+    def __init__(self, repo_name):
+        self.dir = os.path.join(PIPELINE_DIR, repo_name.replace('/', '-'))
+        self.path = os.path.join(self.dir, 'manifest.json')
+        try:
+            with open(self.path) as f:
+                self.stages = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.stages = {}
+
+    def artifact(self, name):
+        return os.path.join(self.dir, name)
+
+    def is_current(self, stage, input_hash):
+        entry = self.stages.get(stage)
+        if entry is None or entry['input'] != input_hash:
+            return False
+        for path, digest in entry['outputs'].items():
+            if not os.path.exists(path) or result_cache.file_digest(path) != digest:
+                return False
+        return True
+
+    def record(self, stage, input_hash, outputs, seconds):
+        self.stages[stage] = {
+            'input': input_hash,
+            'outputs': {path: result_cache.file_digest(path) for path in outputs},
+            'seconds': round(seconds, 3),
+            'finished': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.stages, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def output_digest(self, stage, path):
+        return self.stages[stage]['outputs'][path]
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def _gather(repo_name, package):
+    import github_gather
+    repo_url = github_gather.GIT_BASE_URL + repo_name + ".git"
+    # A clone folder of its own, as repos with the same name may run in parallel
+    tmp = tempfile.mkdtemp(prefix=package + '-', dir='.')
+    try:
+        github_gather.get_commits_df(repo_url, repo_name, os.path.join(tmp, 'repo'))
+    finally:
+        shutil.rmtree(tmp)
+    return ['data/' + package + '-commits.csv', 'data/' + package + '-commits_w_desc.csv']
+
+
+def _monthly(repo_name, package):
+    import pandas as pd
+    import github_gather
+    df = pd.read_csv('data/' + package + '-commits.csv')
+    github_gather.get_monthly_commits(df, repo_name)
+    return ['data/' + package + '-monthly.csv']
+
+
+def run_repo(repo_name, forecast_length=12, do_plot=False, force=False, offline=False):
+    """
+    Run the stages of the pipeline for '<owner>/<repo>' that are out of date
+
+    Parameters:
+    -----------
+    repo_name : str
+        Repository name in format '<owner>/<repo>'
+    forecast_length : int
+        Number of months the innovation model forecasts
+    do_plot : bool
+        Whether the models save their plots in `images/`
+    force : bool
+        Run every stage even if it is up to date
+    offline : bool
+        Do not check the remote for new commits, and keep the gathered data
+        while it exists
+
+    Returns:
+    --------
+    dict
+        'repo', 'ran' and 'skipped' stages, and the 'bass' and 'innovation' results
+    """
+    package = repo_name.replace('/', '-')
+    manifest = Manifest(repo_name)
+    ran, skipped = [], []
+
+    def stage(name, input_hash, run):
+        if not force and manifest.is_current(name, input_hash):
+            skipped.append(name)
+            return
+        print(f"[{repo_name}] Stage {name} started", flush=True)
+        start = time.perf_counter()
+        outputs = run()
+        seconds = time.perf_counter() - start
+        manifest.record(name, input_hash, outputs, seconds)
+        ran.append(name)
+        print(f"[{repo_name}] Stage {name} finished in {seconds:.1f}s", flush=True)
+
+    commits_file = 'data/' + package + '-commits.csv'
+    monthly_file = 'data/' + package + '-monthly.csv'
+    bass_file = manifest.artifact('bass.json')
+    innovation_file = manifest.artifact('innovation.json')
+
+    # gather: up to date while the remote HEAD has not moved
+    head = None if offline else remote_head(repo_name)
+    if head is None and 'gather' in manifest.stages:
+        head = manifest.stages['gather']['input']
+    if head is None and os.path.exists(commits_file):
+        # Data gathered outside the pipeline, e.g. the example data in data/
+        skipped.append('gather')
+    else:
+        if head is None:
+            raise RuntimeError(f"Cannot reach the remote of {repo_name} and no data was gathered")
+        stage('gather', head, lambda: _gather(repo_name, package))
+
+    stage('monthly', _hash(result_cache.file_digest(commits_file)),
+          lambda: _monthly(repo_name, package))
+
+    def bass():
+        import fit_bass
+        _write_json(bass_file, fit_bass.run_bass(repo_name, do_plot=do_plot))
+        return [bass_file]
+
+    monthly_digest = manifest.output_digest('monthly', monthly_file)
+    stage('bass', _hash(monthly_digest, do_plot), bass)
+
+    def innovation():
+        import fit_innovation
+        with open(bass_file) as f:
+            bass_fit = json.load(f)
+        _write_json(innovation_file, fit_innovation.run_innovation(
+            repo_name, forecast_length, do_plot=do_plot, bass_fit=bass_fit))
+        return [innovation_file]
+
+    stage('innovation', _hash(monthly_digest, manifest.output_digest('bass', bass_file),
+                              forecast_length, do_plot), innovation)
+
+    with open(bass_file) as f:
+        bass_result = json.load(f)
+    with open(innovation_file) as f:
+        innovation_result = json.load(f)
+    return {'repo': repo_name, 'ran': ran, 'skipped': skipped,
+            'bass': bass_result, 'innovation': innovation_result}
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def run_pipeline(repo_names, workers=None, **options):
+    """
+    Run the pipeline for each repository in `repo_names`, in parallel processes
+
+    Returns:
+    --------
+    list
+        The `run_repo` result of each repository, or {'repo', 'error'} if it failed
+    """
+    workers = min(workers or os.cpu_count(), len(repo_names))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(run_repo, repo_name, **options) for repo_name in repo_names]
+        for repo_name, future in zip(repo_names, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({'repo': repo_name, 'error': f"{type(e).__name__}: {e}"})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the modeling pipeline for repositories")
+    parser.add_argument('repo_names', nargs='+', help="repositories as <owner>/<repo>")
+    parser.add_argument('--workers', type=int, help="repositories run at once (default: one per core)")
+    parser.add_argument('--forecast-length', type=int, default=12, help="months to forecast")
+    parser.add_argument('--plot', action='store_true', help="save the model plots in images/")
+    parser.add_argument('--force', action='store_true', help="run every stage again")
+    parser.add_argument('--offline', action='store_true',
+                        help="do not check the remotes for new commits")
+    args = parser.parse_args(argv)
+
+    results = run_pipeline(args.repo_names, args.workers, forecast_length=args.forecast_length,
+                           do_plot=args.plot, force=args.force, offline=args.offline)
+    for result in results:
+        if 'error' in result:
+            print(f"{result['repo']}: failed: {result['error']}")
+        else:
+            print(f"{result['repo']}: ran {', '.join(result['ran']) or 'nothing'}; "
+                  f"skipped {', '.join(result['skipped']) or 'nothing'}; "
+                  f"remaining years {result['bass']['remaining_years']}")
+
+
+# Main run
+if __name__ == "__main__":
+    main()
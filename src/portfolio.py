@@ -0,0 +1,185 @@
+"""
+Portfolio mode: fits the life cycle of many repositories at once and puts the
+results side by side.
+Repositories are read from a manifest and run through the pipeline (see
+`pipeline.py`) in parallel, from the data already gathered unless `--fetch` is
+given, so stages that are up to date are not run again. The Bass parameters,
+end of growth and innovation parameters of every repository are written to one
+table, as CSV and as the `lifecycles` table of a SQLite file, and their fitted
+developer engagement curves are drawn in one figure, as in
+`images/all_project_lifecycles.png`.
+Functions:
+    read_manifest(path):
+        Repository names from a text file (one per line) or a CSV with a 'repo' column.
+    summarize(result):
+        One row of the results table from a pipeline result.
+    run_portfolio(repo_names, workers=None, fetch=False, forecast_length=12):
+        Runs the pipeline for every repository and returns the results and table.
+    save_table(df, output):
+        Writes the table to `<output>.csv` and `<output>.sqlite`.
+    plot_lifecycles(results, path):
+        Draws the fitted engagement curves of all repositories in one figure.
+Usage:
+    python src/portfolio.py <manifest> [--workers N] [--fetch] [--output data/portfolio]
+        [--figure images/portfolio_lifecycles.png]
+
+    Example query of the results:
+    sqlite3 data/portfolio.sqlite "SELECT repo, end_of_growth FROM lifecycles ORDER BY m DESC"
+"""
+
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+
+# Above this many repositories the figure has no legend
+MAX_LEGEND = 25
+
+
+def read_manifest(path):
+    """Repository names from a text file, one per line ('#' starts a comment), or a CSV with a 'repo' column"""
+    if path.endswith('.csv'):
+        return pd.read_csv(path)['repo'].dropna().str.strip().tolist()
+    repo_names = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                repo_names.append(line)
+    return repo_names
+
+
+def summarize(result):
+    """
+    One row of the results table from a `pipeline.run_repo` result
+
+    Returns:
+    --------
+    dict
+        Bass parameters, the month of peak engagement and the end of growth (as
+        months since the start and as a date), the innovation parameters, and
+        the error for repositories that failed
+    """
+    if 'error' in result:
+        return {'repo': result['repo'], 'status': 'failed', 'error': result['error']}
+    bass, innovation = result['bass'], result['innovation']
+    p, q, T = bass['p'], bass['q'], bass['T']
+    start = pd.Timestamp(bass['start_date'])
+    # The Bass curve peaks at ln(q/p)/(p+q) when imitation outweighs innovation
+    peak = float(np.log(q / p) / (p + q)) if q > p > 0 else 0.0
+    return {
+        'repo': result['repo'],
+        'status': 'ok',
+        'start_date': bass['start_date'],
+        'end_date': bass['end_date'],
+        'months': bass['t'],
+        'p': p,
+        'q': q,
+        'm': bass['m'],
+        'peak_month': peak,
+        'peak_date': (start + pd.DateOffset(months=int(round(peak)))).strftime('%Y-%m'),
+        'T': T,
+        'end_of_growth': (start + pd.DateOffset(months=int(round(T)))).strftime('%Y-%m') if T is not None else None,
+        'remaining_years': bass['remaining_years'],
+        'gamma': innovation['gamma'],
+        'lambda': innovation['lambda'],
+        'phi': innovation['phi'],
+        'error': None,
+    }
+
+
+def run_portfolio(repo_names, workers=None, fetch=False, forecast_length=12):
+    """
+    Run the pipeline for every repository in parallel and tabulate the results
+
+    Parameters:
+    -----------
+    repo_names : list
+        Repositories in format '<owner>/<repo>'
+    workers : int, optional
+        Repositories run at once, default one per core
+    fetch : bool
+        Check the remotes and gather new commits, instead of using the data
+        already gathered
+    forecast_length : int
+        Months forecast by the innovation model
+
+    Returns:
+    --------
+    tuple
+        The pipeline results and the results table as a pandas.DataFrame
+    """
+    results = pipeline.run_pipeline(repo_names, workers, forecast_length=forecast_length,
+                                    do_plot=False, offline=not fetch)
+    return results, pd.DataFrame([summarize(result) for result in results])
+
+
+def save_table(df, output):
+    """Write the results table to `<output>.csv` and to the `lifecycles` table of `<output>.sqlite`"""
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    df.to_csv(output + '.csv', index=False)
+    with sqlite3.connect(output + '.sqlite') as conn:
+        df.to_sql('lifecycles', conn, if_exists='replace', index=False)
+    print(f"Saved results to {output}.csv and {output}.sqlite")
+
+
+def plot_lifecycles(results, path):
+    """
+    Draw the fitted developers per month of every repository against the
+    calendar, solid through its data and dashed through its end of growth
+    """
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(15, 6))
+    colors = plt.get_cmap('tab20')
+    ok = [result for result in results if 'error' not in result]
+    for k, result in enumerate(sorted(ok, key=lambda result: result['repo'])):
+        bass = result['bass']
+        fitted = np.asarray(bass['fitted'])
+        dates = pd.date_range(bass['start_date'], periods=len(fitted), freq='ME')
+        t = bass['t']
+        color = colors(k % 20)
+        plt.plot(dates[:t], fitted[:t], color=color, linewidth=2, label=result['repo'].replace('/', '-'))
+        plt.plot(dates[t - 1:], fitted[t - 1:], color=color, linewidth=2, linestyle='--')
+    plt.title("Developer engagement for selected projects")
+    plt.xlabel("Date")
+    plt.ylabel("No. of Developers making contributions in each month")
+    plt.grid(True)
+    if len(ok) <= MAX_LEGEND:
+        plt.legend(loc='upper right')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    plt.savefig(path)
+    plt.close()
+    print(f"Saved figure to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit and compare the life cycles of many repositories")
+    parser.add_argument('manifest', help="text file with one <owner>/<repo> per line, or a CSV with a 'repo' column")
+    parser.add_argument('--workers', type=int, help="repositories run at once (default: one per core)")
+    parser.add_argument('--fetch', action='store_true',
+                        help="gather new commits from the remotes instead of using the gathered data")
+    parser.add_argument('--forecast-length', type=int, default=12, help="months to forecast")
+    parser.add_argument('--output', default=os.path.join('data', 'portfolio'),
+                        help="results table path, without extension")
+    parser.add_argument('--figure', default=os.path.join('images', 'portfolio_lifecycles.png'))
+    args = parser.parse_args(argv)
+
+    import matplotlib
+    matplotlib.use('Agg')
+    results, df = run_portfolio(read_manifest(args.manifest), args.workers, args.fetch,
+                                args.forecast_length)
+    save_table(df, args.output)
+    plot_lifecycles(results, args.figure)
+    failed = df[df['status'] == 'failed']
+    print(f"{len(df) - len(failed)} of {len(df)} repositories fitted")
+    for _, row in failed.iterrows():
+        print(f"  {row['repo']}: {row['error']}")
+
+
+# Main run
+if __name__ == "__main__":
+    main()
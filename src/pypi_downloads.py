@@ -0,0 +1,197 @@
+"""
+Local store of the daily PyPI downloads of packages, from pypistats.org.
+The downloads of each day and category ('with_mirrors', 'without_mirrors') are
+kept in a SQLite file, so totals over any window are answered without the
+network and the history grows past the 180 days pypistats serves.
+A refresh asks pypistats only when the store may be missing a day: not when the
+store already has yesterday (UTC), the last day pypistats publishes, nor
+within REFRESH_HOURS of the last request. Only the days after the last one
+stored are added.
+Classes:
+    DownloadStore(path=DEFAULT_PATH):
+        `refresh(package)` adds the new days of a package and returns their number,
+        `total(package, start, end)` sums downloads over a window,
+        `monthly(package)` gives downloads per month.
+Functions:
+    last_month_downloads(package, store=None):
+        Downloads of the previous calendar month.
+    last_6_months_downloads(package, store=None):
+        Downloads of the last 180 days.
+Usage:
+    python src/pypi_downloads.py <package> [<package> ...] [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--save]
+"""
+
+import argparse
+import datetime as dt
+import json
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+DEFAULT_PATH = os.path.join('cache', 'pypi_downloads.sqlite')
+
+# Category summed by default; without_mirrors is a subset of it
+CATEGORY = 'with_mirrors'
+
+# Hours between two requests for a package whose latest day is not published yet
+REFRESH_HOURS = 6
+
+
+def _yesterday():
+    return (dt.datetime.now(dt.timezone.utc).date() - dt.timedelta(days=1)).isoformat()
+
+
+class DownloadStore:
+    def __init__(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    package TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    downloads INTEGER NOT NULL,
+                    PRIMARY KEY (package, category, date)
+                );
+                CREATE TABLE IF NOT EXISTS syncs (
+                    package TEXT PRIMARY KEY,
+                    last_date TEXT,
+                    checked REAL NOT NULL
+                );""")
+
+    def last_date(self, package):
+        """Last day stored for `package`, or None"""
+        row = self.conn.execute("SELECT last_date FROM syncs WHERE package = ?", (package.lower(),)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, package, force=False):
+        """
+        Add the days of `package` published since the last refresh
+
+        Returns:
+        --------
+        int
+            Number of new days stored, 0 when pypistats was not asked or had
+            no data for the package
+        """
+        package = package.lower()
+        row = self.conn.execute("SELECT last_date, checked FROM syncs WHERE package = ?", (package,)).fetchone()
+        last_date, checked = row if row else (None, 0)
+        if not force and row is not None and (
+                (last_date is not None and last_date >= _yesterday())
+                or time.time() - checked < REFRESH_HOURS * 3600):
+            return 0
+
+        import pypistats
+        # pypistats always serves its whole window and filters dates locally,
+        # so the days already stored are dropped here
+        reply = pypistats.overall(package, total='daily', format='json')
+        try:
+            data = json.loads(reply)['data'] if reply else []
+        except (ValueError, KeyError, TypeError):
+            # E.g. "No data found for https://pypistats.org/api/packages/..."
+            data = []
+        rows = [(package, day['category'], day['date'], day['downloads']) for day in data
+                if last_date is None or day['date'] > last_date]
+        new_last = max([row[2] for row in rows], default=last_date)
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)", (package, new_last, time.time()))
+        return len({row[2] for row in rows})
+
+    def total(self, package, start=None, end=None, category=CATEGORY):
+        """Downloads of `package` from `start` through `end` ('YYYY-MM-DD', inclusive)"""
+        row = self.conn.execute(
+            "SELECT SUM(downloads) FROM downloads WHERE package = ? AND category = ? "
+            "AND date >= ? AND date <= ?",
+            (package.lower(), category, start or '0000-00-00', end or '9999-99-99')).fetchone()
+        return row[0] or 0
+
+    def daily(self, package, category=CATEGORY):
+        """Downloads of `package` per day as a pandas.DataFrame with 'date' and 'downloads'"""
+        df = pd.read_sql_query(
+            "SELECT date, downloads FROM downloads WHERE package = ? AND category = ? ORDER BY date",
+            self.conn, params=(package.lower(), category))
+        df['date'] = pd.to_datetime(df['date'], utc=True)
+        return df
+
+    def monthly(self, package, category=CATEGORY):
+        """
+        Downloads of `package` per month, dated at the end of the month as in
+        the monthly data of `github_gather`, and the days stored in each month
+        """
+        df = self.daily(package, category)
+        return df.groupby(pd.Grouper(key='date', freq='ME')).agg(
+            downloads=('downloads', 'sum'),
+            days=('downloads', 'size'),
+        ).reset_index()
+
+    def close(self):
+        self.conn.close()
+
+
+def _with_store(store, func):
+    own = store is None
+    store = store or DownloadStore()
+    try:
+        return func(store)
+    finally:
+        if own:
+            store.close()
+
+
+def last_month_downloads(package, store=None):
+    """Downloads of `package` in the previous calendar month"""
+    first = dt.datetime.now(dt.timezone.utc).date().replace(day=1)
+    start = (first - dt.timedelta(days=1)).replace(day=1)
+
+    def run(store):
+        store.refresh(package)
+        return store.total(package, start.isoformat(), (first - dt.timedelta(days=1)).isoformat())
+    return _with_store(store, run)
+
+
+def last_6_months_downloads(package, store=None):
+    """Downloads of `package` in the last 180 days, the window pypistats serves"""
+    start = (dt.date.fromisoformat(_yesterday()) - dt.timedelta(days=179)).isoformat()
+
+    def run(store):
+        store.refresh(package)
+        return store.total(package, start)
+    return _with_store(store, run)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store and total the daily PyPI downloads of packages")
+    parser.add_argument('packages', nargs='+', help="PyPI package names")
+    parser.add_argument('--start', help="first day of a custom window, YYYY-MM-DD")
+    parser.add_argument('--end', help="last day of a custom window, YYYY-MM-DD")
+    parser.add_argument('--force', action='store_true', help="ask pypistats even if the store is up to date")
+    parser.add_argument('--save', action='store_true',
+                        help="save the monthly downloads to data/pypi-<package>-monthly.csv")
+    args = parser.parse_args(argv)
+
+    store = DownloadStore()
+    try:
+        for package in args.packages:
+            print(f"{package}: {store.refresh(package, force=args.force)} new days, "
+                  f"stored through {store.last_date(package)}")
+            print(f"  last month     {last_month_downloads(package, store):>14,}")
+            print(f"  last 6 months  {last_6_months_downloads(package, store):>14,}")
+            if args.start or args.end:
+                print(f"  {args.start or 'start'} to {args.end or 'end'}  "
+                      f"{store.total(package, args.start, args.end):>14,}")
+            if args.save:
+                output_file = 'data/pypi-' + package.lower() + '-monthly.csv'
+                store.monthly(package).to_csv(output_file)
+                print(f"  Saved monthly downloads to {output_file}")
+    finally:
+        store.close()
+
+
+# Main run
+if __name__ == "__main__":
+    main()
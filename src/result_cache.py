@@ -0,0 +1,141 @@
+"""
+Content-hash cache for model results served by the server.
+A result is keyed by the SHA-256 of the repo's `data/<owner>-<repo>-monthly.csv`
+and the model options, so a repeat request is answered without refitting and a
+regenerated data file automatically misses the cache. Entries keep the fitted
+parameters and forecasts (`result.json`) next to copies of the rendered images.
+Functions:
+    file_digest(path):
+        SHA-256 of a file, memoized on its size and modification time.
+    entry_key(kind, repo_name, options):
+        Cache key for a model result, or None if there is no data file.
+    etag(key):
+        ETag sent to clients for the result cached under `key`.
+    load(key):
+        Returns the cached result for `key` (restoring its images), or None.
+    store(key, result):
+        Saves a result and its images, dropping entries built from older data.
+    publish(result):
+        Moves the images of a fresh result from its job's folder into `images/`.
+"""
+
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+CACHE_DIR = os.path.join('cache', 'results')
+IMAGES_DIR = 'images'
+
+_digests = {}
+_lock = threading.Lock()
+
+
+def file_digest(path):
+    """Return the SHA-256 of `path`, rehashing only when its size or mtime change"""
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        cached = _digests.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _lock:
+        _digests[path] = (stamp, digest)
+    return digest
+
+
+def entry_key(kind, repo_name, options=None, data_digest=None):
+    """
+    Return the cache key for a `kind` ('bass' or 'innovation') result on
+    '<owner>/<repo>', of the form '<owner>-<repo>/<kind>-<data hash>-<options hash>'
+    The data hash is that of the current monthly data file, or `data_digest`
+    for a result fitted to an earlier version of it
+    """
+    repo_string = repo_name.replace('/', '-')
+    data_file = 'data/' + repo_string + '-monthly.csv'
+    if data_digest is None:
+        if not os.path.exists(data_file):
+            return None
+        data_digest = file_digest(data_file)
+    options = json.dumps(options or {}, sort_keys=True)
+    options_digest = hashlib.sha256(options.encode()).hexdigest()
+    return f"{repo_string}/{kind}-{data_digest[:16]}-{options_digest[:16]}"
+
+
+def etag(key):
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def load(key):
+    """Return the cached result for `key`, copying its images back into `images/` if needed"""
+    entry = os.path.join(CACHE_DIR, key)
+    try:
+        with open(os.path.join(entry, 'result.json')) as f:
+            result = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    for image in result['result'].get('images', []):
+        cached_image = os.path.join(entry, os.path.basename(image))
+        if not os.path.exists(image) or not filecmp.cmp(cached_image, image, shallow=False):
+            os.makedirs(os.path.dirname(image), exist_ok=True)
+            shutil.copyfile(cached_image, image)
+    return result
+
+
+def _published(image):
+    return os.path.join(IMAGES_DIR, os.path.basename(image))
+
+
+def publish(result):
+    """
+    Move the images of a fresh result from the job's folder into `images/`,
+    returning the result with their new paths
+    """
+    images = result.get('result', {}).get('images', [])
+    if not images:
+        return result
+    for image in images:
+        if os.path.abspath(image) != os.path.abspath(_published(image)):
+            os.makedirs(IMAGES_DIR, exist_ok=True)
+            os.replace(image, _published(image))
+    job_dir = os.path.dirname(images[0])
+    if os.path.abspath(job_dir) != os.path.abspath(IMAGES_DIR):
+        shutil.rmtree(job_dir, ignore_errors=True)
+    return {**result, 'result': {**result['result'], 'images': [_published(image) for image in images]}}
+
+
+def store(key, result):
+    """
+    Save `result` and its images under `key`, removing stale entries for the
+    same model. The images are read from where the fit saved them, and
+    recorded as their published paths in `images/`
+    """
+    entry = os.path.join(CACHE_DIR, key)
+    repo_dir, name = os.path.split(entry)
+    kind, data_digest, _ = name.rsplit('-', 2)
+    os.makedirs(entry, exist_ok=True)
+
+    images = result['result'].get('images', [])
+    for image in images:
+        shutil.copyfile(image, os.path.join(entry, os.path.basename(image)))
+    result = {**result, 'result': {**result['result'], 'images': [_published(image) for image in images]}}
+    tmp_file = os.path.join(entry, f'result.json.{os.getpid()}.{threading.get_ident()}')
+    with open(tmp_file, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp_file, os.path.join(entry, 'result.json'))
+
+    # Entries for this model built from an older data file can never be hit
+    # again, unless this result is itself for data that has since changed
+    data_file = 'data/' + os.path.basename(repo_dir) + '-monthly.csv'
+    if not os.path.exists(data_file) or not file_digest(data_file).startswith(data_digest):
+        return
+    for other in os.listdir(repo_dir):
+        if other.startswith(kind + '-') and other.rsplit('-', 2)[1] != data_digest:
+            shutil.rmtree(os.path.join(repo_dir, other), ignore_errors=True)
@@ -0,0 +1,225 @@
+"""
+Activity rollups of a repository's commits at several time grains.
+One pass over `data/<owner>-<repo>-commits.csv` fills a SQLite file,
+`cache/rollups/<owner>-<repo>.sqlite`, with:
+    daily       commits, additions and deletions per (day, author)
+    authors     the first day each author committed
+    rollups     per grain (day, week, month, quarter) and period: contributors,
+                new and returning authors, commits, additions and deletions
+    commits     the ids of the commits already counted
+Questions at any grain are answered from the `rollups` table without reading
+the commits again. After a new gather, `update` counts only the commits it has
+not seen and recomputes only the periods from the earliest new commit on.
+Periods are labeled by their last day, in UTC, as in the monthly data of
+`github_gather.get_monthly_commits`.
+Functions:
+    update(repo_name, path=None):
+        Adds the new commits of the commits file to the rollups.
+    rollup(repo_name, grain='month', start=None, end=None, path=None):
+        The rollup of a grain as a pandas.DataFrame, with empty periods filled in.
+Usage:
+    python src/rollups.py <owner>/<repo> [--grain week] [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+
+import argparse
+import os
+import sqlite3
+
+import pandas as pd
+
+ROLLUP_DIR = os.path.join('cache', 'rollups')
+
+# grain: pandas period frequency
+GRAINS = {'day': 'D', 'week': 'W', 'month': 'M', 'quarter': 'Q'}
+
+COLUMNS = ['contributors', 'new_authors', 'returning_authors', 'commits', 'additions', 'deletions']
+
+
+def _connect(repo_name, path=None):
+    path = path or os.path.join(ROLLUP_DIR, repo_name.replace('/', '-') + '.sqlite')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS daily (
+                day TEXT NOT NULL,
+                author TEXT NOT NULL,
+                commits INTEGER NOT NULL,
+                additions INTEGER NOT NULL,
+                deletions INTEGER NOT NULL,
+                PRIMARY KEY (day, author)
+            );
+            CREATE TABLE IF NOT EXISTS authors (
+                author TEXT PRIMARY KEY,
+                first_day TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS rollups (
+                grain TEXT NOT NULL,
+                date TEXT NOT NULL,
+                contributors INTEGER NOT NULL,
+                new_authors INTEGER NOT NULL,
+                returning_authors INTEGER NOT NULL,
+                commits INTEGER NOT NULL,
+                additions INTEGER NOT NULL,
+                deletions INTEGER NOT NULL,
+                PRIMARY KEY (grain, date)
+            );
+            CREATE TABLE IF NOT EXISTS commits (
+                commit_id TEXT PRIMARY KEY
+            );""")
+    return conn
+
+
+def _label(periods):
+    """Last day of each period, as 'YYYY-MM-DD'"""
+    return periods.dt.end_time.dt.strftime('%Y-%m-%d')
+
+
+def _aggregate(daily, first_days, freq):
+    """Rollup rows of `daily` (day, author, commits, additions, deletions) at `freq`"""
+    period = pd.to_datetime(daily['day']).dt.to_period(freq)
+    first = pd.to_datetime(daily['author'].map(first_days)).dt.to_period(freq)
+    df = daily.assign(period=period, new_author=daily['author'].where(period == first))
+    rows = df.groupby('period').agg(
+        contributors=('author', 'nunique'),
+        new_authors=('new_author', 'nunique'),
+        commits=('commits', 'sum'),
+        additions=('additions', 'sum'),
+        deletions=('deletions', 'sum'),
+    ).reset_index()
+    rows['returning_authors'] = rows['contributors'] - rows['new_authors']
+    rows.insert(0, 'date', _label(rows.pop('period')))
+    return rows
+
+
+def update(repo_name, path=None):
+    """
+    Add the commits of `data/<owner>-<repo>-commits.csv` not yet counted to the rollups
+
+    Parameters:
+    -----------
+    repo_name : str
+        Repository name in format '<owner>/<repo>'
+    path : str, optional
+        SQLite file of the rollups, default `cache/rollups/<owner>-<repo>.sqlite`
+
+    Returns:
+    --------
+    int
+        Number of new commits counted
+    """
+    package = repo_name.replace('/', '-')
+    df = pd.read_csv('data/' + package + '-commits.csv',
+                     usecols=['commit_id', 'author', 'date', 'lines_added', 'lines_removed'])
+    conn = _connect(repo_name, path)
+    try:
+        seen = {row[0] for row in conn.execute("SELECT commit_id FROM commits")}
+        df = df[~df['commit_id'].isin(seen)]
+        if df.empty:
+            return 0
+
+        df['day'] = pd.to_datetime(df['date'], utc=True).dt.strftime('%Y-%m-%d')
+        daily = df.groupby(['day', 'author']).agg(
+            commits=('commit_id', 'size'),
+            additions=('lines_added', 'sum'),
+            deletions=('lines_removed', 'sum'),
+        ).reset_index()
+        first_days = daily.groupby('author')['day'].min()
+        since = daily['day'].min()
+
+        with conn:
+            conn.executemany("""
+                INSERT INTO daily VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (day, author) DO UPDATE SET
+                    commits = commits + excluded.commits,
+                    additions = additions + excluded.additions,
+                    deletions = deletions + excluded.deletions""",
+                daily.itertuples(index=False, name=None))
+            conn.executemany("""
+                INSERT INTO authors VALUES (?, ?)
+                ON CONFLICT (author) DO UPDATE SET first_day = MIN(first_day, excluded.first_day)""",
+                first_days.items())
+            first_days = dict(conn.execute("SELECT author, first_day FROM authors"))
+
+            # New commits change their own periods, and the new and returning
+            # authors of later periods if they move an author's first day back
+            for grain, freq in GRAINS.items():
+                start = pd.Period(since, freq)
+                affected = pd.read_sql_query("SELECT * FROM daily WHERE day >= ?", conn,
+                                             params=(start.start_time.strftime('%Y-%m-%d'),))
+                rows = _aggregate(affected, first_days, freq)
+                conn.execute("DELETE FROM rollups WHERE grain = ? AND date >= ?",
+                             (grain, start.end_time.strftime('%Y-%m-%d')))
+                conn.executemany(
+                    f"INSERT INTO rollups (grain, date, {', '.join(COLUMNS)}) VALUES (?, ?{', ?' * len(COLUMNS)})",
+                    ((grain, row.date, *(int(getattr(row, c)) for c in COLUMNS))
+                     for row in rows.itertuples(index=False)))
+            conn.executemany("INSERT INTO commits VALUES (?)", ((c,) for c in df['commit_id']))
+    finally:
+        conn.close()
+    return len(df)
+
+
+def rollup(repo_name, grain='month', start=None, end=None, path=None):
+    """
+    The activity of '<owner>/<repo>' per period of `grain`
+
+    Parameters:
+    -----------
+    repo_name : str
+        Repository name in format '<owner>/<repo>'
+    grain : str
+        'day', 'week', 'month' or 'quarter'
+    start, end : str, optional
+        First and last dates ('YYYY-MM-DD') of the periods returned
+    path : str, optional
+        SQLite file of the rollups, as in `update`
+
+    Returns:
+    --------
+    pandas.DataFrame
+        'date' (last day of the period), 'contributors', 'new_authors',
+        'returning_authors', 'commits', 'additions', 'deletions' and
+        'total_changes', with zeros for the periods without commits
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain {grain!r}, expected one of {', '.join(GRAINS)}")
+    conn = _connect(repo_name, path)
+    try:
+        df = pd.read_sql_query("SELECT * FROM rollups WHERE grain = ? ORDER BY date", conn,
+                               params=(grain,))
+    finally:
+        conn.close()
+    df = df.drop(columns='grain')
+    if not df.empty:
+        periods = pd.period_range(df['date'].iloc[0], df['date'].iloc[-1], freq=GRAINS[grain])
+        df = (df.set_index('date')
+                .reindex(_label(pd.Series(periods)), fill_value=0)
+                .rename_axis('date').reset_index())
+    if start is not None:
+        df = df[df['date'] >= start]
+    if end is not None:
+        df = df[df['date'] <= end]
+    df['total_changes'] = df['additions'] + df['deletions']
+    return df.reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Roll up a repository's commits by day, week, month or quarter")
+    parser.add_argument('repo_name', help="repository in format <owner>/<repo>, gathered in data/")
+    parser.add_argument('--grain', choices=GRAINS, default='month')
+    parser.add_argument('--start', help="first date, YYYY-MM-DD")
+    parser.add_argument('--end', help="last date, YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    print(f"Counted {update(args.repo_name)} new commits")
+    df = rollup(args.repo_name, args.grain, args.start, args.end)
+    output_file = 'data/' + args.repo_name.replace('/', '-') + '-' + args.grain + '-rollup.csv'
+    df.to_csv(output_file, index=False)
+    print(df.tail(12).to_string(index=False))
+    print(f"Saved rollup to {output_file}")
+
+
+# Main run
+if __name__ == "__main__":
+    main()
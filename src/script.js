@@ -1,3 +1,33 @@
+// Follow a server-sent event stream, passing each progress line to `onProgress`,
+// and resolve with the parsed data of the final `done` event
+function followEvents(url, onProgress) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(url);
+        source.addEventListener('progress', e => onProgress(e.data));
+        source.addEventListener('done', e => {
+            source.close();
+            resolve(JSON.parse(e.data));
+        });
+        source.onerror = () => {
+            source.close();
+            reject(new Error('Lost connection to the server'));
+        };
+    });
+}
+
+// Show the most recent progress lines in `div`
+function progressLog(div, maxLines = 15) {
+    const lines = [];
+    const pre = document.createElement('pre');
+    pre.className = 'progress-log';
+    div.appendChild(pre);
+    return line => {
+        lines.push(line);
+        if (lines.length > maxLines) lines.shift();
+        pre.textContent = lines.join('\n');
+    };
+}
+
 document.getElementById('repo-form').addEventListener('submit', async (e) => {
     e.preventDefault();
     const owner = document.getElementById('owner').value;
@@ -21,7 +51,13 @@ document.getElementById('repo-form').addEventListener('submit', async (e) => {
             body: JSON.stringify({ owner, repo })
         });
 
-        const result = await response.json();
+        const submitted = await response.json();
+        if (!submitted.success) {
+            statusDiv.innerHTML = `Error: ${submitted.error}`;
+            return;
+        }
+
+        const result = await followEvents(`/jobs/${submitted.job_id}/events`, progressLog(statusDiv));
 
         if (result.success) {
             statusDiv.innerHTML = 'Commit data gathered successfully!';
@@ -45,16 +81,52 @@ document.getElementById('repo-form').addEventListener('submit', async (e) => {
     }
 });
 
+// Charts for the model results, created on first use
+const charts = {};
+
+function getChart(id, options) {
+    if (!charts[id]) {
+        charts[id] = new LineChart(document.getElementById(id), options);
+    }
+    return charts[id];
+}
+
+// Show `series` on a chart, overlaying earlier results when comparing repositories
+function showSeries(chart, series, startMonth) {
+    const compare = document.getElementById('compare').checked && chart.series.length > 0;
+    if (compare) {
+        chart.startMonth = null;
+        chart.xLabel = 'Months since project start';
+        chart.addSeries(series);
+    } else {
+        chart.startMonth = startMonth;
+        chart.xLabel = 'Month';
+        chart.setSeries(series);
+    }
+}
+
+// Split a series at month `t` into a solid history and a dashed forecast
+function historyAndForecast(name, values, t) {
+    return [
+        { name, y: values.slice(0, t) },
+        { name: `${name} forecast`, y: values.slice(Math.max(0, t - 1)), x0: Math.max(0, t - 1), dashed: true }
+    ];
+}
+
+function streamModel(kind, owner, repo, onProgress) {
+    return followEvents(`/api/${kind}/${encodeURIComponent(owner)}/${encodeURIComponent(repo)}/stream`, onProgress);
+}
+
+const fmt = x => (x === null || x === undefined) ? 'n/a' : Number(x).toPrecision(4);
+
 // Bass Model Fitting Button Event Listener
 document.getElementById('fit-bass-model').addEventListener('click', async () => {
     const owner = document.getElementById('owner').value;
     const repo = document.getElementById('repo').value;
     const bassModelStatusDiv = document.getElementById('bass-model-status');
-    const bassModelImagesDiv = document.getElementById('bass-model-images');
 
     // Reset previous results
     bassModelStatusDiv.innerHTML = '';
-    bassModelImagesDiv.innerHTML = '';
 
     // Validate input
     if (!owner || !repo) {
@@ -66,31 +138,22 @@ document.getElementById('fit-bass-model').addEventListener('click', async () =>
     bassModelStatusDiv.innerHTML = 'Fitting Bass Model... This may take a few minutes.';
 
     try {
-        const response = await fetch('/run_bass_model', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ owner, repo })
-        });
-
-        const result = await response.json();
-
-        if (result.success) {
-            bassModelStatusDiv.innerHTML = 'Bass Model Fitting Completed!';
-            
-            // Display output text
-            bassModelStatusDiv.innerHTML += `<pre>${result.output}</pre>`;
-
-            // Display generated images
-            if (result.images && result.images.length > 0) {
-                const imagesHTML = result.images.map(imagePath => {
-                    return `<div class="image-container">Image: ${imagePath}</div>`;
-                }).join('');
-                bassModelImagesDiv.innerHTML = `<h4>Bass Model Visualizations</h3>${imagesHTML}`;
-            }
+        const data = await streamModel('bass', owner, repo, progressLog(bassModelStatusDiv));
+
+        if (data.success) {
+            const r = data.result;
+            bassModelStatusDiv.innerHTML = 'Bass Model Fitting Completed!' +
+                `<pre>p=${fmt(r.p)}, q=${fmt(r.q)}, m=${fmt(r.m)}\n` +
+                `Time of zero growth: ${fmt(r.T)} months\n` +
+                `Remaining: ${fmt(r.remaining_years)} years</pre>`;
+
+            const chart = getChart('bass-model-chart', { title: 'Number of Developers per month' });
+            showSeries(chart, [
+                { name: `${owner}/${repo} contributors`, y: r.contributors, points: true },
+                ...historyAndForecast(`${owner}/${repo} Bass fit`, r.fitted, r.t)
+            ], r.dates[0]);
         } else {
-            bassModelStatusDiv.innerHTML = `Error: ${result.error}`;
+            bassModelStatusDiv.innerHTML = `Error: ${data.error}`;
         }
     } catch (error) {
         bassModelStatusDiv.innerHTML = `Error: ${error.message}`;
@@ -102,11 +165,9 @@ document.getElementById('fit-innovation-model').addEventListener('click', async
     const owner = document.getElementById('owner').value;
     const repo = document.getElementById('repo').value;
     const innovationModelStatusDiv = document.getElementById('innovation-model-status');
-    const innovationModelImagesDiv = document.getElementById('innovation-model-images');
 
     // Reset previous results
     innovationModelStatusDiv.innerHTML = '';
-    innovationModelImagesDiv.innerHTML = '';
 
     // Validate input
     if (!owner || !repo) {
@@ -118,31 +179,22 @@ document.getElementById('fit-innovation-model').addEventListener('click', async
     innovationModelStatusDiv.innerHTML = 'Fitting Growth Model... This may take a few minutes.';
 
     try {
-        const response = await fetch('/run_innovation_model', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ owner, repo })
-        });
-
-        const result = await response.json();
-
-        if (result.success) {
-            innovationModelStatusDiv.innerHTML = 'Growth Model Fitting Completed!';
-            
-            // Display output text
-            innovationModelStatusDiv.innerHTML += `<pre>${result.output}</pre>`;
-
-            // Display generated images
-            if (result.images && result.images.length > 0) {
-                const imagesHTML = result.images.map(imagePath => {
-                    return `<div class="image-container">Image: ${imagePath}</div>`;
-                }).join('');
-                innovationModelImagesDiv.innerHTML = `<h4>Growth Visualizations</h3>${imagesHTML}`;
-            }
+        const data = await streamModel('innovation', owner, repo, progressLog(innovationModelStatusDiv));
+
+        if (data.success) {
+            const r = data.result;
+            const t = r.dates.length;
+            innovationModelStatusDiv.innerHTML = 'Growth Model Fitting Completed!' +
+                `<pre>gamma=${fmt(r.gamma)}, lambda=${fmt(r.lambda)}, phi=${fmt(r.phi)}</pre>`;
+
+            showSeries(getChart('innovation-chart', { title: 'Innovation Level A' }), [
+                { name: `${owner}/${repo} cumulative changes`, y: r.cumInnovation, points: true },
+                ...historyAndForecast(`${owner}/${repo} A(t)`, r.A, t)
+            ], r.dates[0]);
+            showSeries(getChart('labor-chart', { title: 'Labor L' }),
+                historyAndForecast(`${owner}/${repo} L(t)`, r.L, t), r.dates[0]);
         } else {
-            innovationModelStatusDiv.innerHTML = `Error: ${result.error}`;
+            innovationModelStatusDiv.innerHTML = `Error: ${data.error}`;
         }
     } catch (error) {
         innovationModelStatusDiv.innerHTML = `Error: ${error.message}`;
@@ -1,8 +1,16 @@
-from flask import Flask, request, jsonify, send_from_directory
-import sys
-import os
-import subprocess
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
+import argparse
+import gzip
+import hashlib
 import json
+import os
+import re
+import shutil
+import sys
+
+import jobs
+import model_pool
+import result_cache
 
 app = Flask(__name__, static_folder='.')
 
@@ -20,45 +28,322 @@ def run_github_gather():
                 'error': 'Owner and repository name are required'
             })
 
-        # Construct repo name and URL
+        # Construct repo name
         repo_name = f"{owner}/{repo}"
         
-        # Run the github_gather script
-        result = subprocess.run([
-            sys.executable, 
-            'src/github_gather.py', 
-            repo_name
-        ], 
-        capture_output=True, 
-        text=True, 
-        cwd=os.getcwd())
-
-        # Check if the script ran successfully
-        if result.returncode == 0:
-            return jsonify({
-                'success': True,
-                'output': result.stdout
-            })
-        else:
+        # Start the gather, or attach to the one already running for this repo
+        job = jobs.submit('gather', repo_name, refresh=bool(data.get('refresh')))
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    try:
+        data = request.get_json()
+        kind = data.get('kind')
+        owner = data.get('owner')
+        repo = data.get('repo')
+
+        if not kind or not owner or not repo:
             return jsonify({
-                'success': False,
-                'error': result.stderr
+                'success': False, 
+                'error': 'Job kind, owner and repository name are required'
             })
 
+        job = jobs.submit(kind, f"{owner}/{repo}", refresh=bool(data.get('refresh')))
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status
+        })
+
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown job {job_id}"
+        }), 404
+    return jsonify(job.to_dict())
+
+def sse(event, data):
+    """Format one server-sent event; `data` may span several lines"""
+    lines = ''.join(f"data: {line}\n" for line in str(data).split('\n'))
+    return f"event: {event}\n{lines}\n"
+
+def stream_job(job, on_done=None):
+    """
+    Stream a job's printed lines as `progress` events, then a `done` event with
+    its result as JSON. Nothing is buffered beyond the job's bounded log
+    """
+    def events():
+        for line in job.follow():
+            # Comment lines keep idle connections open through proxies
+            yield sse('progress', line) if line is not None else ": keepalive\n\n"
+        result = on_done(job.result) if on_done else job.to_dict()
+        yield sse('done', json.dumps(result, separators=(',', ':')))
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown job {job_id}"
+        }), 404
+    return stream_job(job)
+
 # Serve static files
+# Assets linked from index.html carry a content hash (`?v=`), so browsers can
+# keep them for a year; unversioned files are revalidated with their ETag
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+def versioned(match):
+    attr, name = match.groups()
+    digest = result_cache.file_digest(os.path.join(app.root_path, name))
+    return f'{attr}="{name}?v={digest[:12]}"'
+
+def cache_headers(response):
+    if request.args.get('v'):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = ASSET_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
 @app.route('/')
 def serve_index():
-    return send_from_directory('.', 'index.html')
+    with open(os.path.join(app.root_path, 'index.html')) as f:
+        html = re.sub(r'(href|src)="([\w.-]+\.(?:css|js))"', versioned, f.read())
+    response = Response(html, mimetype='text/html')
+    response.set_etag(hashlib.sha256(html.encode()).hexdigest()[:32])
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/images/<path:path>')
+def serve_image(path):
+    # Images generated by the models live in the top level images folder
+    return cache_headers(send_from_directory(os.path.join(os.getcwd(), 'images'), path))
 
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory('.', path)
+    return cache_headers(send_from_directory('.', path))
+
+# Compress text responses, reusing the compressed body of unchanged files
+COMPRESSIBLE = {'text/html', 'text/css', 'text/csv', 'text/javascript',
+                'application/javascript', 'application/json'}
+MIN_COMPRESS_SIZE = 1024
+_gzipped = {}
+
+@app.after_request
+def compress(response):
+    if (response.status_code != 200 or response.mimetype not in COMPRESSIBLE
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.accept_encodings):
+        return response
+
+    etag, _ = response.get_etag()
+    body = _gzipped.get(etag) if etag else None
+    if body is None:
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return response
+        body = gzip.compress(data, compresslevel=6)
+        if etag:
+            if len(_gzipped) >= 256:
+                _gzipped.clear()
+            _gzipped[etag] = body
+    response.close()
+    response.set_data(body)
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers.pop('Accept-Ranges', None)
+    response.vary.add('Accept-Encoding')
+    if etag:
+        # The compressed body differs byte for byte, so the ETag becomes weak
+        response.set_etag(etag, weak=True)
+    return response
+
+def finish_model_job(job, result):
+    """
+    Cache a fresh model result once per job, under the data it was actually
+    fitted to (not cached if that data changed during the fit), and move its
+    images from the job's folder into `images/`
+    """
+    if job.kind not in ('bass', 'innovation'):
+        return result
+    if result['success'] and result.get('data_digest'):
+        key = result_cache.entry_key(job.kind, job.repo_name, job.options, result['data_digest'])
+        result_cache.store(key, result)
+    if result['success']:
+        result = result_cache.publish(result)
+    shutil.rmtree(os.path.join(model_pool.JOB_IMAGES_DIR, job.id), ignore_errors=True)
+    return result
+
+jobs.set_result_handler(finish_model_job)
+
+def cached_model_result(kind, repo_name, **options):
+    """
+    Fetch a model result from the result cache, fitting the model in the
+    worker pool on a miss. Returns (result, etag, cached); the etag is None
+    for a result that was not cached
+    """
+    key = result_cache.entry_key(kind, repo_name, options)
+    if key is None:
+        raise FileNotFoundError(f"No monthly data for {repo_name}. Gather the commits first.")
+
+    result = result_cache.load(key)
+    cached = result is not None
+    if not cached:
+        # Cached by finish_model_job when the fit finished
+        result = jobs.submit(kind, repo_name, **options).wait()
+        digest = result.get('data_digest')
+        key = result_cache.entry_key(kind, repo_name, options, digest) if digest else None
+    return result, result_cache.etag(key) if key else None, cached
+
+def run_cached_model(kind, repo_name, compact=False, **options):
+    """
+    Answer a model request from the result cache. Returns 304 when the
+    client already has the result. A `compact` response leaves out the
+    printed log and the whitespace
+    """
+    try:
+        key = result_cache.entry_key(kind, repo_name, options)
+        if key is not None and request.if_none_match.contains_weak(result_cache.etag(key)):
+            return Response(status=304, headers={'ETag': f'"{result_cache.etag(key)}"'})
+        result, etag, cached = cached_model_result(kind, repo_name, **options)
+    except FileNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+    if not result['success']:
+        return jsonify({
+            'success': False,
+            'error': result['error']
+        })
+
+    if compact:
+        response = Response(json.dumps({
+            'success': True,
+            'cached': cached,
+            'result': result['result']
+        }, separators=(',', ':')), mimetype='application/json')
+    else:
+        response = jsonify({
+            'success': True,
+            'cached': cached,
+            'output': result['output'],
+            'result': result['result'],
+            'images': result['result']['images']
+        })
+    if etag:
+        response.set_etag(etag)
+    return response
+
+# Longest forecast a request may ask for, in months
+MAX_FORECAST_LENGTH = 120
+
+def forecast_length_option(value):
+    """The forecast length of a request as an int from 1 to MAX_FORECAST_LENGTH"""
+    try:
+        forecast_length = int(value)
+    except (TypeError, ValueError):
+        forecast_length = None
+    if forecast_length is None or isinstance(value, float) or not 1 <= forecast_length <= MAX_FORECAST_LENGTH:
+        raise ValueError(f"forecast_length must be a whole number of months from 1 to {MAX_FORECAST_LENGTH}")
+    return forecast_length
+
+def model_options(kind):
+    """Model options from the query string of a data API request"""
+    options = {'do_plot': request.args.get('render', '0') == '1'}
+    if kind == 'innovation':
+        options['forecast_length'] = forecast_length_option(request.args.get('forecast_length', 12))
+    return options
+
+@app.route('/api/<kind>/<owner>/<repo>', methods=['GET'])
+def model_data(kind, owner, repo):
+    """
+    Fitted parameters, historical series and forecasts of a model as JSON
+    for charting in the browser. PNGs are only rendered with `?render=1`
+    """
+    if kind not in ('bass', 'innovation'):
+        return jsonify({
+            'success': False,
+            'error': f"Unknown model {kind}"
+        }), 404
+
+    try:
+        options = model_options(kind)
+        return run_cached_model(kind, f"{owner}/{repo}", compact=True, **options)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/<kind>/<owner>/<repo>/stream', methods=['GET'])
+def model_data_stream(kind, owner, repo):
+    """
+    Same data as /api/<kind>/<owner>/<repo>, sent as the `done` event of a
+    stream of the fit's progress lines
+    """
+    if kind not in ('bass', 'innovation'):
+        return jsonify({
+            'success': False,
+            'error': f"Unknown model {kind}"
+        }), 404
+
+    repo_name = f"{owner}/{repo}"
+    try:
+        options = model_options(kind)
+    except ValueError as e:
+        return Response(sse('done', json.dumps({
+            'success': False,
+            'error': str(e)
+        })), mimetype='text/event-stream')
+    key = result_cache.entry_key(kind, repo_name, options)
+    if key is None:
+        return Response(sse('done', json.dumps({
+            'success': False,
+            'error': f"No monthly data for {repo_name}. Gather the commits first."
+        })), mimetype='text/event-stream')
+
+    cached = result_cache.load(key)
+    if cached is not None:
+        return Response(sse('done', json.dumps({
+            'success': True,
+            'cached': True,
+            'result': cached['result']
+        }, separators=(',', ':'))), mimetype='text/event-stream')
+
+    def on_done(result):
+        # Already cached by finish_model_job, once for every follower
+        if not result['success']:
+            return {'success': False, 'error': result['error']}
+        return {'success': True, 'cached': False, 'result': result['result']}
+    return stream_job(jobs.submit(kind, repo_name, **options), on_done)
 
 @app.route('/run_bass_model', methods=['POST'])
 def run_bass_model():
@@ -74,38 +359,8 @@ def run_bass_model():
                 'error': 'Owner and repository name are required'
             })
 
-        # Construct repo name
-        repo_name = f"{owner}/{repo}"
-        repo_string = f"{owner}-{repo}"
-        
-        # Run the Bass model fitting script
-        result = subprocess.run([
-            sys.executable, 
-            'src/fit_bass.py', 
-            repo_name
-        ], 
-        capture_output=True, 
-        text=True, 
-        cwd=os.getcwd())
-
-        # Check if the script ran successfully
-        if result.returncode == 0:
-            # Read the generated image files
-            image_files = [
-                f"images/{repo_string}_fit_contributors.png",
-                f"images/{repo_string}_contributors_to_end.png"
-            ]
-            
-            return jsonify({
-                'success': True,
-                'output': result.stdout,
-                'images': image_files
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': result.stderr
-            })
+        # Fit the Bass model, or reuse the fit for unchanged data
+        return run_cached_model('bass', f"{owner}/{repo}")
 
     except Exception as e:
         return jsonify({
@@ -127,39 +382,9 @@ def run_innovation_model():
                 'error': 'Owner and repository name are required'
             })
 
-        # Construct repo name
-        repo_name = f"{owner}/{repo}"
-        repo_string = f"{owner}-{repo}"
-        
-        # Run the innovation model fitting script
-        result = subprocess.run([
-            sys.executable, 
-            'src/fit_innovation.py', 
-            repo_name
-        ], 
-        capture_output=True, 
-        text=True, 
-        cwd=os.getcwd())
-
-        # Check if the script ran successfully
-        if result.returncode == 0:
-            # Read the generated image files
-            image_files = [
-                f"images/{repo_string}_innovation_fit.png",
-                f"images/{repo_string}_polyfit_innovation.png",
-                f"images/{repo_string}_forecasts.png"
-            ]
-            
-            return jsonify({
-                'success': True,
-                'output': result.stdout,
-                'images': image_files
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': result.stderr
-            })
+        # Fit the innovation model, or reuse the fit for unchanged data
+        forecast_length = forecast_length_option(data.get('forecast_length', 12))
+        return run_cached_model('innovation', f"{owner}/{repo}", forecast_length=forecast_length)
 
     except Exception as e:
         return jsonify({
@@ -167,5 +392,37 @@ def run_innovation_model():
             'error': str(e)
         })
 
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GitHub Lifecycle Analyzer server")
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=model_pool.DEFAULT_WORKERS,
+                        help="number of warm model worker processes")
+    parser.add_argument('--gather-workers', type=int, default=model_pool.DEFAULT_GATHER_WORKERS,
+                        help="number of gathers run at once, in processes of their own")
+    parser.add_argument('--production', action='store_true',
+                        help="serve with waitress instead of the Flask development server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--threads', type=int, default=32,
+                        help="request threads in production mode")
+    args = parser.parse_args(argv)
+
+    if args.production:
+        # One process with many request threads, so every request shares the
+        # job and result caches; the model work runs in the worker pool
+        try:
+            from waitress import serve
+        except ImportError:
+            sys.exit("Production mode needs waitress: pip install waitress")
+        model_pool.start(args.workers, args.gather_workers)
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+    else:
+        # The reloader runs the app in a child process; only start the pool there
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            model_pool.start(args.workers, args.gather_workers)
+        app.run(debug=True, host=args.host, port=args.port)
+
+
+# Main run
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    main()
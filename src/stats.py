@@ -1,18 +1,20 @@
 ##### Code to collect stats for a given repo #####
 
-import json
 import logging
 import os
 import re
 
 import subprocess
 import tempfile
-from typing import List, Tuple, TypedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, TypedDict
+from urllib.parse import parse_qs, urlparse
 
-import pypistats
 import requests
 from bs4 import BeautifulSoup
-from pypistats.cli import _month, _last_month
+from pypistats.cli import _month
+
+import pypi_downloads
 
 # USAGE
 # data = get_all_stats([
@@ -50,19 +52,13 @@ def get_stars(repo: str) -> int:
     return r.json()['stargazers_count']
 
 
-def get_monthly_pypi_downloads(package: str):
-    start_date, end_date = _last_month()
-    downloads = pypistats.overall(
-        package, 
-        total="monthly", 
-        format="json", 
-        start_date=start_date,
-        end_date=end_date
-    )
+def get_monthly_pypi_downloads(package: str) -> int:
+    """Returns the PyPI downloads of the previous month
 
-    downloads = json.loads(downloads)
-    
-    return sum(d['downloads'] for d in downloads['data'])
+    Read from the local download store, which asks pypistats only for
+    the days it does not have yet (see `pypi_downloads.py`).
+    """
+    return pypi_downloads.last_month_downloads(package)
     
 
 def get_total_contributors_from_web(repo: str) -> int:
@@ -84,32 +80,75 @@ def get_total_contributors_from_api(repo: str) -> int:
     Does not produce accurate results for repos that have higher 
     number of contributors than 500. See this issue for more info.
     https://github.com/orgs/community/discussions/24355
+
+    Rather than following `next` links one page at a time, the page
+    count is read from the `last` link of the first response, so the
+    total needs at most two round trips (first and last page). Set
+    `concurrent=True` in `count_contributors_from_api` to fetch every
+    page in parallel instead. Results are cached per repo.
     """
     
-    url = f"https://api.github.com/repos/{repo}/contributors?per_page=100&anon=1"
+    return count_contributors_from_api(repo)
+
+
+_contributors_cache = {}
+
+
+def count_contributors_from_api(repo: str, per_page: int = 100,
+                                concurrent: bool = False, max_workers: int = 8,
+                                use_cache: bool = True) -> int:
+    """Counts contributors using the Link header of the first page.
+
+    All pages but the last hold exactly `per_page` entries, so the total is
+    `(last_page - 1) * per_page + len(last page)`. With `concurrent=True`
+    the remaining pages are fetched in a thread pool and counted directly.
+    With `use_cache=False` the per-repo cache is neither read nor written.
+    """
+    if use_cache and repo in _contributors_cache:
+        return _contributors_cache[repo]
+
+    url = f"https://api.github.com/repos/{repo}/contributors"
     headers = {
         "Authorization": f"Bearer {os.environ['GITHUB_API_TOKEN']}", 
         "Accept": "application/vnd.github.v3+json"
     }
 
-    contributor_count = 0
-    
-    while url:
-        r = requests.get(url, headers=headers)
+    def fetch_page(page: int) -> int:
+        r = requests.get(url, headers=headers,
+                         params={"per_page": per_page, "anon": 1, "page": page})
         r.raise_for_status()
+        return len(r.json())
 
-        contributor_count += len(r.json())
-        try:
-            url = r.links["next"]['url']
-        except KeyError:
-            url = None
-
+    r = requests.get(url, headers=headers, params={"per_page": per_page, "anon": 1})
+    r.raise_for_status()
+    first_page_count = len(r.json())
+    last_page = _last_page_number(r)
+
+    if last_page is None or last_page <= 1:
+        contributor_count = first_page_count
+    elif concurrent:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            counts = executor.map(fetch_page, range(2, last_page + 1))
+            contributor_count = first_page_count + sum(counts)
+    else:
+        contributor_count = (last_page - 1) * per_page + fetch_page(last_page)
+
+    if use_cache:
+        _contributors_cache[repo] = contributor_count
     return contributor_count
 
 
-def get_total_contributors(repo: str) -> int:
-    """Returns total no of contributors for a Github repo"""
+def get_total_contributors(repo: str, use_api: bool = False) -> int:
+    """Returns total no of contributors for a Github repo
     
+    Scrapes the repo page by default. With `use_api=True` and a 
+    `GITHUB_API_TOKEN` set, counts through the Github API instead 
+    (see `count_contributors_from_api`), which is capped at 500 
+    contributors for large repos.
+    """
+    
+    if use_api and os.environ.get('GITHUB_API_TOKEN'):
+        return count_contributors_from_api(repo)
     return get_total_contributors_from_web(repo)
 
 
@@ -212,6 +251,15 @@ def _last_n_month(n: int) -> tuple[str, str]:
 
     return start_month[0], end_month[1]
 
+def _last_page_number(response) -> Optional[int]:
+    """Helper to return the page number of the `last` link of a paginated response"""
+    try:
+        last_url = response.links["last"]["url"]
+    except KeyError:
+        return None
+    page = parse_qs(urlparse(last_url).query).get("page")
+    return int(page[0]) if page else None
+
 def _parse_commit_log(commit_log: str) -> Tuple[int, int]:
     """Parses a git commit log and returns the total no of
     additions and deletions in the git repository.
@@ -273,5 +321,4 @@ def _get_commit_log(directory: str) -> str:
         logger.error(f"Error running git log command: {e}")
 
 def total_downloads_6months(pypi_package_name):
-    df = pypistats.overall(pypi_package_name, total=True, format="pandas")
-    return df['downloads'].sum()
+    return pypi_downloads.last_6_months_downloads(pypi_package_name)
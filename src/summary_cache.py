@@ -0,0 +1,58 @@
+"""
+Persistent cache of LLM summaries for activity reports.
+Summaries are stored in a SQLite file under a content-addressed key built from
+what determines them: the commit hash (or the set of commits for a monthly
+rollup), a version of the prompt and the model id. Reruns, overlapping months
+and regenerated reports only call the model for commits not seen before.
+Functions:
+    summary_key(kind, prompt_version, model_id, *parts):
+        Key for a summary of `kind` ('commit' or 'rollup') built from `parts`.
+Classes:
+    SummaryCache(path=DEFAULT_PATH):
+        `get(key)` returns a stored summary or None, `put(key, kind, summary)`
+        stores one. Safe to share between threads.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = os.path.join('cache', 'summaries.sqlite')
+
+
+def summary_key(kind, prompt_version, model_id, *parts):
+    h = hashlib.sha256()
+    for part in (kind, prompt_version, model_id, *parts):
+        h.update(str(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class SummaryCache:
+    def __init__(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    created REAL NOT NULL
+                )""")
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, kind, summary):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)",
+                              (key, kind, summary, time.time()))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,243 @@
+"""
+Opt-in instrumentation of the model fits in `fit_bass` and `fit_innovation`.
+Telemetry is off unless the environment variable `OSS_LIFECYCLE_TELEMETRY` is
+set to a folder, or `--telemetry <folder>` is given to `fit_bass.py` or
+`fit_innovation.py`. While off, the instrumented functions cost one extra
+check per call. While on, each `run_bass` or `run_innovation` call is a session
+that records:
+    functions   calls, total, mean, min and max seconds of each instrumented
+                function (e.g. the objective `pct_least_squares` and `model`)
+    history     the optimizer path, e.g. the parameters and objective value at
+                every Nelder-Mead iteration of `fitInnovation`
+    events      one-off results, e.g. the guess, evaluations and convergence of
+                `find_zero`
+and writes `<folder>/<session>-<time>-<pid>.json`.
+Tracing memory and profiling slow a fit down several times, which would skew
+the timings above, so each is a further opt-in:
+    memory      with `OSS_LIFECYCLE_TELEMETRY_MEMORY=1` (or `--telemetry-memory`),
+                peak memory allocated by Python (tracemalloc) and the lines
+                holding the most memory at the end of the session
+    profile     with `OSS_LIFECYCLE_TELEMETRY_PROFILE=1` (or `--telemetry-profile`),
+                a cProfile dump of the session in `.prof` next to the record
+                (open with `python -m pstats`, `snakeviz` or `flameprof` for a
+                flame graph)
+Environment variables are inherited, so the pipeline and server workers
+record their fits too.
+Functions:
+    enable(directory, profile=None, memory=None):
+        Turns telemetry on, writing to `directory`, and profiling or memory
+        tracing on or off (unchanged if None).
+    session(name):
+        Context manager recording one fit; nested sessions are part of the outer one.
+    counted(func):
+        Decorator recording the calls and timings of `func` during a session.
+    trace(series, **values):
+        Appends a point to the history `series` of the current session.
+    event(name, **values):
+        Records a one-off result in the current session.
+    active():
+        Whether a session is recording.
+Usage:
+    OSS_LIFECYCLE_TELEMETRY=cache/telemetry python src/fit_innovation.py <owner>/<repo>
+    python src/fit_bass.py <owner>/<repo> --telemetry cache/telemetry --telemetry-profile
+    python src/telemetry.py cache/telemetry/<session>.json
+"""
+
+import argparse
+import cProfile
+import functools
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+def _env_flag(name):
+    return os.environ.get(name, '').lower() not in ('', '0', 'false', 'no')
+
+
+# Folder the sessions are written to, None while telemetry is off
+TELEMETRY_DIR = os.environ.get('OSS_LIFECYCLE_TELEMETRY') or None
+
+# Whether sessions also profile the fit and trace its memory
+PROFILE = _env_flag('OSS_LIFECYCLE_TELEMETRY_PROFILE')
+MEMORY = _env_flag('OSS_LIFECYCLE_TELEMETRY_MEMORY')
+
+# Allocation sites listed in the memory report
+TOP_ALLOCATIONS = 10
+
+_session = None
+
+
+class Session:
+    def __init__(self, name):
+        self.name = name
+        self.started = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.start = time.perf_counter()
+        self.functions = {}
+        self.history = {}
+        self.events = []
+        self.memory = {}
+
+    def add_call(self, name, seconds):
+        stats = self.functions.get(name)
+        if stats is None:
+            self.functions[name] = [1, seconds, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = min(stats[2], seconds)
+            stats[3] = max(stats[3], seconds)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'started': self.started,
+            'seconds': round(time.perf_counter() - self.start, 6),
+            'functions': {
+                name: {'calls': calls, 'seconds': round(total, 6),
+                       'mean_ms': round(total / calls * 1000, 6),
+                       'min_ms': round(low * 1000, 6), 'max_ms': round(high * 1000, 6)}
+                for name, (calls, total, low, high) in self.functions.items()
+            },
+            'history': self.history,
+            'events': self.events,
+            'memory': self.memory,
+        }
+
+
+def _jsonable(value):
+    """Plain Python values for numpy scalars and arrays"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def enable(directory, profile=None, memory=None):
+    """Turn telemetry on, writing sessions to `directory`, with profiling and memory tracing if asked"""
+    global TELEMETRY_DIR, PROFILE, MEMORY
+    TELEMETRY_DIR = directory
+    if profile is not None:
+        PROFILE = profile
+    if memory is not None:
+        MEMORY = memory
+
+
+def active():
+    """Whether a session is recording"""
+    return _session is not None
+
+
+@contextmanager
+def session(name):
+    """
+    Record the calls, optimizer history and events of the code run inside,
+    and its memory and profile if those are on, and save them when it exits.
+    Does nothing while telemetry is off, and inside another session.
+    """
+    global _session
+    if TELEMETRY_DIR is None or _session is not None:
+        yield None
+        return
+
+    current = _session = Session(name)
+    tracing = MEMORY
+    started_tracing = tracing and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if tracing:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile() if PROFILE else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+    except ValueError:
+        # Another profiler is running
+        profiler = None
+    try:
+        yield current
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+            if started_tracing:
+                tracemalloc.stop()
+            current.memory = {
+                'peak_bytes': peak,
+                'top': [{'where': str(stat.traceback), 'bytes': stat.size} for stat in top],
+            }
+        _session = None
+        _save(current, profiler)
+
+
+def _save(current, profiler):
+    os.makedirs(TELEMETRY_DIR, exist_ok=True)
+    stem = os.path.join(TELEMETRY_DIR, f"{current.name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    with open(stem + '.json', 'w') as f:
+        json.dump(current.to_dict(), f, indent=2)
+    if profiler is not None:
+        profiler.dump_stats(stem + '.prof')
+    print(f"Saved telemetry to {stem}.json", flush=True)
+
+
+def counted(func):
+    """Record the number of calls and the time of each call of `func` during a session"""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _session is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # The session may have ended inside func
+            if _session is not None:
+                _session.add_call(name, time.perf_counter() - start)
+    return wrapper
+
+
+def trace(series, **values):
+    """Append a point, e.g. iteration, parameters and objective value, to the history `series`"""
+    if _session is not None:
+        _session.history.setdefault(series, []).append(
+            {key: _jsonable(value) for key, value in values.items()})
+
+
+def event(name, **values):
+    """Record a one-off result, e.g. the outcome of a solver"""
+    if _session is not None:
+        _session.events.append({'event': name, **{key: _jsonable(value) for key, value in values.items()}})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a telemetry session")
+    parser.add_argument('path', help="session .json file")
+    args = parser.parse_args(argv)
+
+    with open(args.path) as f:
+        data = json.load(f)
+    print(f"Session {data['name']} started {data['started']}, {data['seconds']:.2f}s")
+    print(f"{'function':<28}{'calls':>10}{'seconds':>10}{'mean ms':>10}{'max ms':>10}")
+    for name, stats in sorted(data['functions'].items(), key=lambda item: -item[1]['seconds']):
+        print(f"{name:<28}{stats['calls']:>10}{stats['seconds']:>10.3f}"
+              f"{stats['mean_ms']:>10.3f}{stats['max_ms']:>10.3f}")
+    for series, points in data['history'].items():
+        print(f"History {series}: {len(points)} points, first {points[0]}, last {points[-1]}")
+    for event in data['events']:
+        print("Event", event)
+    if data['memory']:
+        print(f"Peak memory {data['memory']['peak_bytes'] / 2**20:.1f} MiB")
+    prof = os.path.splitext(args.path)[0] + '.prof'
+    if os.path.exists(prof):
+        print(f"Profile: python -m pstats {prof}")
+
+
+# Main run
+if __name__ == "__main__":
+    main()
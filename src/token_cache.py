@@ -0,0 +1,54 @@
+"""
+Persistent cache of token counts for `count_tokens`.
+Counts are stored in a SQLite file per git blob SHA and tokenizer, so a file
+is only tokenized again when its content changes, in any repository.
+Classes:
+    TokenCache(path=DEFAULT_PATH):
+        `get_many(shas, tokenizer)` returns the stored counts of the blobs found
+        as {sha: tokens}, `put_many(counts, tokenizer)` stores {sha: tokens}.
+        Blobs that could not be decoded are stored with None tokens.
+"""
+
+import os
+import sqlite3
+import threading
+
+DEFAULT_PATH = os.path.join('cache', 'tokens.sqlite')
+
+# SQLite limits the number of parameters of one statement
+CHUNK = 500
+
+
+class TokenCache:
+    def __init__(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS tokens (
+                    sha TEXT NOT NULL,
+                    tokenizer TEXT NOT NULL,
+                    tokens INTEGER,
+                    PRIMARY KEY (sha, tokenizer)
+                )""")
+
+    def get_many(self, shas, tokenizer):
+        shas = list(shas)
+        found = {}
+        with self.lock:
+            for k in range(0, len(shas), CHUNK):
+                chunk = shas[k:k + CHUNK]
+                rows = self.conn.execute(
+                    f"SELECT sha, tokens FROM tokens WHERE tokenizer = ? "
+                    f"AND sha IN ({','.join('?' * len(chunk))})", (tokenizer, *chunk))
+                found.update(rows)
+        return found
+
+    def put_many(self, counts, tokenizer):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)",
+                                  ((sha, tokenizer, tokens) for sha, tokens in counts.items()))
+
+    def close(self):
+        self.conn.close()
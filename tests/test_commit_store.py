@@ -0,0 +1,49 @@
+import os
+import sys
+import threading
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import commit_store  # noqa: E402
+
+
+def make_commits(tmp_path):
+    commits_file = str(tmp_path / 'owner-repo-commits_w_desc.csv')
+    df = pd.DataFrame({
+        'hash': ['h1', 'h2', 'h3'],
+        'author': ['a', 'b', 'a'],
+        'date': ['2024-01-05 10:00:00+00:00', '2024-01-20 10:00:00+00:00', '2024-03-02 10:00:00+00:00'],
+        'message': ['one', 'two', 'three'],
+    })
+    df.to_csv(commits_file, index=False)
+    return commits_file, df
+
+
+def test_load_month(tmp_path):
+    commits_file, _ = make_commits(tmp_path)
+    assert list(commit_store.load_month(commits_file, '2024-01', ['hash'])['hash']) == ['h1', 'h2']
+    february = commit_store.load_month(commits_file, '2024-02', ['hash', 'message'])
+    assert february.empty and list(february.columns) == ['hash', 'message']
+
+
+def test_readers_always_find_the_month_while_the_store_is_rewritten(tmp_path):
+    commits_file, df = make_commits(tmp_path)
+    commit_store.write_commit_store(df, commits_file)
+    stop = threading.Event()
+
+    def rewrite():
+        while not stop.is_set():
+            commit_store.write_commit_store(df, commits_file)
+
+    writer = threading.Thread(target=rewrite)
+    writer.start()
+    try:
+        for _ in range(200):
+            assert len(commit_store.load_month(commits_file, '2024-01', ['hash'])) == 2
+    finally:
+        stop.set()
+        writer.join()
+    assert sorted(os.listdir(tmp_path)) == ['owner-repo-commits_w_desc', 'owner-repo-commits_w_desc.csv']
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import count_tokens  # noqa: E402
+
+
+def git(repo, *args, date=None):
+    env = {**os.environ, 'GIT_AUTHOR_NAME': 'a', 'GIT_AUTHOR_EMAIL': 'a@example.com',
+           'GIT_COMMITTER_NAME': 'a', 'GIT_COMMITTER_EMAIL': 'a@example.com'}
+    if date is not None:
+        env.update({'GIT_AUTHOR_DATE': date, 'GIT_COMMITTER_DATE': date})
+    return subprocess.run(['git', '-C', repo, *args], env=env, capture_output=True,
+                          text=True, check=True).stdout.strip()
+
+
+def commit_file(repo, path, text, date=None):
+    full = os.path.join(repo, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, 'w') as f:
+        f.write(text)
+    git(repo, 'add', path)
+    git(repo, 'commit', '-q', '-m', path, date=date)
+    return git(repo, 'rev-parse', 'HEAD')
+
+
+def test_github_folder_is_counted_and_git_folder_is_not(tmp_path):
+    repo = str(tmp_path)
+    git(repo, 'init', '-q')
+    commit_file(repo, '.github/workflows/ci.yml', 'on: push\n')
+    commit_file(repo, '.gitignore', 'build/\n')
+    commit_file(repo, 'src/main.py', 'print(1)\n')
+
+    paths = {path for path, _, _ in count_tokens.list_blobs(repo, quiet=True)}
+    assert paths == {'.github/workflows/ci.yml', '.gitignore', 'src/main.py'}
+    # git never tracks files under .git/, so the directory rule is checked directly
+    assert count_tokens._excluded('.git/config')
+    assert count_tokens._excluded('vendor/.git/HEAD')
+    assert not count_tokens._excluded('.github/workflows/ci.yml')
+
+
+def test_snapshots_with_a_commit_out_of_time_order(tmp_path):
+    repo = str(tmp_path)
+    git(repo, 'init', '-q')
+    january = commit_file(repo, 'a.py', 'a = 1\n', date='2024-01-15T12:00:00Z')
+    commit_file(repo, 'b.py', 'b = 1\n', date='2024-03-10T12:00:00Z')
+    # E.g. cherry-picked with its original February time, after the March commit
+    commit_file(repo, 'c.py', 'c = 1\n', date='2024-02-05T12:00:00Z')
+    last = commit_file(repo, 'd.py', 'd = 1\n', date='2024-03-20T12:00:00Z')
+
+    df = count_tokens.snapshots(repo)
+    assert [d.strftime('%Y-%m-%d') for d in df['date']] == ['2024-01-31', '2024-02-29', '2024-03-31']
+    # At the end of February the branch held neither the March commit nor the one after it
+    assert list(df['commit']) == [january, january, last]